@@ -0,0 +1,98 @@
+"""按钮回调解析微基准：旧的 '_' 分隔格式 vs 前缀查表 + 打包句柄
+
+旧格式按 startswith 链依次判断前缀再 split('_')，新格式取第一个字符查表后解码 base64 句柄。
+两种格式使用同样的按钮分布（翻页、复制、类型、返回、统计、快速搜索），同时统计 callback_data 长度。
+
+用法: python bench_callback_parse.py [--count 200000]
+"""
+import argparse
+import random
+import time
+
+from common import load_bot
+
+def legacy_dispatch(data):
+    """改造前 button_handler 的解析逻辑"""
+    if data.startswith('type_'):
+        parts = data.split('_')
+        return 'type', parts[1], 0, int(parts[2])
+    elif data.startswith('page_'):
+        parts = data.split('_')
+        return 'page', parts[1], int(parts[2]), int(parts[3])
+    elif data.startswith('stats_'):
+        return 'stats', None, 0, int(data.split('_')[1])
+    elif data.startswith('back_types_'):
+        return 'back', None, 0, int(data.split('_')[2])
+    elif data.startswith('quick_'):
+        return 'quick', data.split('_')[1], 0, 0
+    elif data.startswith('copy_'):
+        parts = data.split('_')
+        return 'copy', None, int(parts[2]), int(parts[1])
+    elif data == 'back_main':
+        return 'main', None, 0, 0
+
+def make_buttons(bot, count, seed=42):
+    """生成 (旧格式, 新格式) 按钮对，翻页和复制占大多数"""
+    rng = random.Random(seed)
+    types = ['magnet', 'quark', 'baidu', 'aliyun', 'xunlei', '115']
+    session = {'keyword': '钢铁侠'}
+    buttons = []
+    for _ in range(count):
+        user_id = rng.randint(10 ** 8, 8 * 10 ** 9)
+        resource_type = rng.choice(types)
+        page = rng.randint(0, 40)
+        item = rng.randint(0, 4)
+        kind = rng.choices(['page', 'copy', 'type', 'back', 'stats', 'quick'], [40, 30, 15, 8, 4, 3])[0]
+        if kind == 'page':
+            pair = (f"page_{resource_type}_{page}_{user_id}", bot.encode_callback('P', user_id, session, resource_type, page))
+        elif kind == 'copy':
+            pair = (f"copy_{user_id}_{page}_{page * 5 + item + 1}", bot.encode_callback('C', user_id, session, resource_type, page, item))
+        elif kind == 'type':
+            pair = (f"type_{resource_type}_{user_id}", bot.encode_callback('T', user_id, session, resource_type))
+        elif kind == 'back':
+            pair = (f"back_types_{user_id}", bot.encode_callback('B', user_id, session))
+        elif kind == 'stats':
+            pair = (f"stats_{user_id}", bot.encode_callback('S', user_id, session))
+        else:
+            pair = (f"quick_{resource_type}", bot.encode_callback('Q', resource_type=resource_type))
+        buttons.append(pair)
+    return buttons
+
+def measure(func, items, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(items) * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=200_000)
+    args = parser.parse_args()
+    
+    bot = load_bot(LOG_LEVEL='WARNING')
+    buttons = make_buttons(bot, args.count)
+    legacy = [old for old, _ in buttons]
+    compact = [new for _, new in buttons]
+    
+    def compact_dispatch(data):
+        action, handle = bot.decode_callback(data)
+        return bot.CALLBACK_ROUTES.get(action), handle
+    
+    for name, items in (('旧格式', legacy), ('新格式', compact)):
+        lengths = [len(data.encode()) for data in items]
+        print(f"{name}: callback_data 平均 {sum(lengths) / len(lengths):.1f} 字节, 最长 {max(lengths)} 字节")
+    print(f"旧格式 startswith + split: {measure(legacy_dispatch, legacy):8.1f} ns/次")
+    print(f"新格式 前缀查表 + 解码句柄: {measure(compact_dispatch, compact):8.1f} ns/次")
+    
+    # 解码结果必须与编码时的字段一致
+    session = {'keyword': '钢铁侠'}
+    for resource_type in ('magnet', 'some_new_type'):
+        _, handle = bot.decode_callback(bot.encode_callback('C', 8_000_000_001, session, resource_type, 65535, 4))
+        assert (handle.user_id, handle.resource_type, handle.page, handle.item) == (8_000_000_001, resource_type, 65535, 4)
+        assert handle.result_tag == bot.result_tag(session)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""端到端基准：模拟 Pansou 后端和 Bot API，驱动 bot.py 中真实的处理器
+
+在本地启动 FakePansou（可配置延迟、结果数量或回放录制的响应）和 FakeBotAPI，
+通过 bot.build_application() 创建的 Application 处理模拟更新。每个模拟用户重复：
+发送关键词搜索 -> 点击第一个资源类型 -> 点击下一页 -> 返回类型选择，
+关键词按 Zipf 分布从关键词池中抽取，以体现缓存命中。
+
+输出吞吐量、每个操作的 p50/p95/p99，以及 bot 内部各阶段（按直方图桶估算）的耗时。
+与基准文件比较，p95 或吞吐量超出容差时以非零状态退出；--update-baseline 写入新的基准。
+
+用法: python bench_e2e.py [--users 50] [--rounds 3] [--keywords 30] [--latency 0.2] [--items 50]
+                         [--recorded 录制响应文件或目录] [--tolerance 0.3] [--update-baseline]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+from telegram import Update
+
+from common import BENCH_DIR, FakeBotAPI, FakePansou, Timer, load_bot
+
+ACTIONS = ('search', 'type', 'page', 'back')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baselines', 'e2e.json')
+# p95 的绝对容差（毫秒），避免毫秒级的抖动被判为回退
+SLACK_MS = 5
+
+class SimulatedUsers:
+    """通过 Application.process_update 模拟用户的消息和按钮点击"""
+    
+    def __init__(self, application, api, keywords, seed):
+        self.application = application
+        self.api = api
+        self.keywords = keywords
+        self.weights = [1 / (rank + 1) for rank in range(len(keywords))]
+        self.rng = random.Random(seed)
+        self.update_ids = itertools.count(1)
+        self.timers = {action: Timer(action) for action in ACTIONS}
+        self.failures = 0
+    
+    def user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}
+    
+    def message(self, user_id, message_id, text='', sender=None):
+        return {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': sender or self.user(user_id),
+            'text': text,
+        }
+    
+    async def process(self, action, update):
+        with self.timers[action].time():
+            await self.application.process_update(Update.de_json(update, self.application.bot))
+    
+    def last_buttons(self, user_id):
+        """取出该用户最近一条消息上的按钮 callback_data"""
+        params = self.api.last_params.get(user_id) or {}
+        markup = params.get('reply_markup') or {}
+        if isinstance(markup, str):
+            markup = json.loads(markup)
+        message_id = int(params.get('message_id') or 0)
+        buttons = [button.get('callback_data', '') for row in markup.get('inline_keyboard', []) for button in row]
+        return message_id, buttons
+    
+    async def click(self, action, user_id, prefix):
+        """点击最近一条消息上第一个以 prefix 开头的按钮，没有这样的按钮时返回 False"""
+        message_id, buttons = self.last_buttons(user_id)
+        data = next((button for button in buttons if button.startswith(prefix)), None)
+        if data is None:
+            return False
+        bot_user = {'id': 123456, 'is_bot': True, 'first_name': 'bench'}
+        await self.process(action, {
+            'update_id': next(self.update_ids),
+            'callback_query': {
+                'id': str(next(self.update_ids)),
+                'from': self.user(user_id),
+                'chat_instance': str(user_id),
+                'data': data,
+                'message': self.message(user_id, message_id or 1, sender=bot_user),
+            },
+        })
+        return True
+    
+    async def run_user(self, user_id, rounds):
+        for _ in range(rounds):
+            keyword = self.rng.choices(self.keywords, self.weights)[0]
+            update_id = next(self.update_ids)
+            await self.process('search', {'update_id': update_id, 'message': self.message(user_id, update_id, keyword)})
+            if not await self.click('type', user_id, 'T'):
+                self.failures += 1
+                continue
+            await self.click('page', user_id, 'P')
+            if not await self.click('back', user_id, 'B'):
+                self.failures += 1
+
+def histogram_quantiles(bot, quantiles=(0.5, 0.95, 0.99)):
+    """从 PHASE_SECONDS 直方图按桶线性插值估算各阶段分位数（毫秒）"""
+    buckets = {}
+    for metric in bot.metrics_registry.collect():
+        if metric.name != 'pansou_bot_phase_seconds':
+            continue
+        for sample in metric.samples:
+            if sample.name.endswith('_bucket'):
+                buckets.setdefault(sample.labels['phase'], []).append((float(sample.labels['le']), sample.value))
+    
+    result = {}
+    for phase, points in buckets.items():
+        points.sort()
+        total = points[-1][1]
+        if not total:
+            continue
+        estimates = {'count': int(total)}
+        for q in quantiles:
+            rank = q * total
+            lower_bound, lower_count = 0.0, 0.0
+            for bound, count in points:
+                if count >= rank:
+                    if bound == float('inf'):
+                        value = lower_bound
+                    else:
+                        value = lower_bound + (bound - lower_bound) * (rank - lower_count) / max(count - lower_count, 1e-9)
+                    break
+                lower_bound, lower_count = bound, count
+            estimates[f"p{round(q * 100)}_ms"] = value * 1000
+        result[phase] = estimates
+    return result
+
+async def run(args):
+    pansou = FakePansou(latency=args.latency, items_per_type=args.items, recorded=args.recorded)
+    api = FakeBotAPI()
+    bot = load_bot(
+        SEARCH_API_URL=pansou.search_url,
+        TELEGRAM_BASE_URL=api.base_url,
+        RATE_LIMIT_RATE=0,
+        LOG_LEVEL='WARNING',
+    )
+    application = bot.build_application()
+    await application.initialize()
+    
+    keywords = [f"关键词{i}" for i in range(args.keywords)]
+    users = SimulatedUsers(application, api, keywords, args.seed)
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*[users.run_user(user_id, args.rounds) for user_id in range(1, args.users + 1)])
+        elapsed = time.perf_counter() - start
+    finally:
+        await application.shutdown()
+        # 与正常停止时一样执行 post_shutdown：先取消渐进式搜索的轮询等后台任务，再关闭连接池
+        await bot.shutdown(application)
+    
+    actions = sum(len(timer.samples) for timer in users.timers.values())
+    print(f"用户 {args.users} × 轮次 {args.rounds}, 关键词池 {args.keywords}, 后端延迟 {args.latency * 1000:.0f}ms")
+    print(f"后端请求: 登录 {pansou.counts['login']} 次, 搜索 {pansou.counts['search']} 次, 401 {pansou.counts['unauthorized']} 次")
+    print(f"吞吐量: {actions / elapsed:.1f} 操作/s, {len(users.timers['search'].samples) / elapsed:.1f} 搜索/s (耗时 {elapsed:.2f}s)")
+    for timer in users.timers.values():
+        timer.report()
+    phases = histogram_quantiles(bot)
+    for phase, estimates in sorted(phases.items()):
+        print(f"{'阶段 ' + phase:<28} n={estimates['count']:<6} p50≈{estimates['p50_ms']:8.3f}ms  p95≈{estimates['p95_ms']:8.3f}ms  p99≈{estimates['p99_ms']:8.3f}ms")
+    if users.failures:
+        print(f"⚠️ {users.failures} 次操作没有找到预期的按钮")
+    
+    return {
+        'throughput': actions / elapsed,
+        'actions': {action: timer.summary() for action, timer in users.timers.items()},
+        'phases': phases,
+        'failures': users.failures,
+    }
+
+def run_config(args):
+    """决定结果是否可比的运行参数"""
+    return {key: getattr(args, key) for key in ('users', 'rounds', 'keywords', 'latency', 'items', 'recorded', 'seed')}
+
+def compare(result, baseline, tolerance):
+    """返回超出容差的回退项"""
+    regressions = []
+    for action, summary in result['actions'].items():
+        expected = baseline['actions'].get(action, {}).get('p95_ms')
+        if expected is not None and summary['p95_ms'] > expected * (1 + tolerance) + SLACK_MS:
+            regressions.append(f"{action} p95 {summary['p95_ms']:.1f}ms > 基准 {expected:.1f}ms")
+    if result['throughput'] < baseline['throughput'] * (1 - tolerance):
+        regressions.append(f"吞吐量 {result['throughput']:.1f}/s < 基准 {baseline['throughput']:.1f}/s")
+    if result['failures'] > baseline.get('failures', 0):
+        regressions.append(f"失败操作 {result['failures']} 次 > 基准 {baseline.get('failures', 0)} 次")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--keywords', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.2, help='模拟后端的搜索延迟（秒）')
+    parser.add_argument('--items', type=int, default=50, help='每种网盘类型生成的结果数')
+    parser.add_argument('--recorded', default=None, help='录制的 /api/search 响应文件或目录')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.3, help='允许的相对回退比例')
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+    
+    result = asyncio.run(run(args))
+    config = run_config(args)
+    
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, **result}, f, ensure_ascii=False, indent=2)
+        print(f"📝 已写入基准: {args.baseline}")
+        return
+    
+    if not os.path.exists(args.baseline):
+        print(f"⚠️ 没有基准文件 {args.baseline}，使用 --update-baseline 生成")
+        return
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('config') != config:
+        print("⚠️ 运行参数与基准不同，跳过比较")
+        return
+    
+    regressions = compare(result, baseline, args.tolerance)
+    if regressions:
+        for regression in regressions:
+            print(f"❌ {regression}")
+        sys.exit(1)
+    print(f"✅ 未超过基准（容差 {args.tolerance:.0%}）")
+
+if __name__ == '__main__':
+    main()
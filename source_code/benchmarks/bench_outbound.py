@@ -0,0 +1,104 @@
+"""Telegram 发送队列检查：编辑合并、聊天发送速率和 429 重试
+
+对本地模拟的 Bot API 运行 bot.py 中的 OutboundScheduler：
+1. 多个聊天各自连续快速编辑同一条消息（模拟连续点击翻页），统计实际发出的编辑次数；
+2. 向同一个聊天连续发送消息，检查突发之后的发送间隔符合 OUTBOUND_CHAT_RATE；
+3. 让模拟 API 返回 429，检查按 retry_after 等待后重试成功。
+任何一项不符合预期时以非零状态退出。
+
+用法: python bench_outbound.py [--chats 20] [--edits 30]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+from telegram import Bot
+
+from common import FakeBotAPI, load_bot
+
+CHAT_RATE = 2
+CHAT_BURST = 3
+
+async def edit_burst(bot, tg, api, chats, edits):
+    """每个聊天以 10ms 间隔编辑同一条消息 edits 次"""
+    async def one_chat(chat_id):
+        tasks = []
+        for i in range(edits):
+            text = f"第 {i + 1} 页"
+            factory = lambda text=text: tg.edit_message_text(text, chat_id=chat_id, message_id=1)
+            tasks.append(asyncio.create_task(bot.outbound.edit(chat_id, (chat_id, 1), factory)))
+            await asyncio.sleep(0.01)
+        results = await asyncio.gather(*tasks)
+        return results[-1].text
+    
+    start = time.perf_counter()
+    last_texts = await asyncio.gather(*[one_chat(chat_id) for chat_id in range(1, chats + 1)])
+    elapsed = time.perf_counter() - start
+    
+    calls = [params for _, method, params in api.calls if method == 'editMessageText']
+    final = {}
+    for params in calls:
+        final[int(params['chat_id'])] = params['text']
+    
+    print(f"编辑合并: {chats} 个聊天 × {edits} 次点击 -> 实际发送 {len(calls)} 次编辑, 耗时 {elapsed:.2f}s, 合并 {bot.outbound.coalesced} 次")
+    ok = len(calls) < chats * edits
+    ok &= all(text == f"第 {edits} 页" for text in last_texts)
+    ok &= all(final[chat_id] == f"第 {edits} 页" for chat_id in range(1, chats + 1))
+    return ok
+
+async def chat_rate(bot, tg, api, messages):
+    """向同一个聊天连续发送 messages 条消息，检查突发之后的间隔"""
+    chat_id = 10_000
+    api.calls.clear()
+    await asyncio.gather(*[
+        bot.outbound.send(chat_id, lambda i=i: tg.send_message(chat_id, f"消息 {i}"))
+        for i in range(messages)
+    ])
+    times = [t for t, method, params in api.calls if int(params['chat_id']) == chat_id]
+    gaps = [b - a for a, b in zip(times[CHAT_BURST - 1:], times[CHAT_BURST:])]
+    min_gap = min(gaps) if gaps else 0.0
+    print(f"聊天速率: {messages} 条消息, 突发 {CHAT_BURST} 条后最小间隔 {min_gap * 1000:.0f}ms (限制 {1000 / CHAT_RATE:.0f}ms)")
+    return len(times) == messages and min_gap >= 1 / CHAT_RATE * 0.9
+
+async def retry_after(bot, tg, api):
+    """前两次发送返回 429，检查按 retry_after 等待后重试成功"""
+    chat_id = 20_000
+    api.flood(2, retry_after=1)
+    retries = bot.outbound.retries
+    start = time.perf_counter()
+    message = await bot.outbound.send(chat_id, lambda: tg.send_message(chat_id, "429 测试"))
+    elapsed = time.perf_counter() - start
+    print(f"429 重试: 重试 {bot.outbound.retries - retries} 次后成功, 耗时 {elapsed:.2f}s")
+    return message.text == "429 测试" and bot.outbound.retries - retries == 2 and elapsed >= 2
+
+async def run(chats, edits):
+    api = FakeBotAPI()
+    bot = load_bot(OUTBOUND_CHAT_RATE=CHAT_RATE, OUTBOUND_CHAT_BURST=CHAT_BURST, OUTBOUND_GLOBAL_RATE=1000)
+    logging.getLogger().setLevel(logging.WARNING)
+    tg = Bot('123456:bench', base_url=f"{api.base_url}/bot")
+    await tg.initialize()
+    try:
+        results = [
+            await edit_burst(bot, tg, api, chats, edits),
+            await chat_rate(bot, tg, api, 8),
+            await retry_after(bot, tg, api),
+        ]
+    finally:
+        await tg.shutdown()
+    return all(results)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chats', type=int, default=20)
+    parser.add_argument('--edits', type=int, default=30)
+    args = parser.parse_args()
+    
+    if not asyncio.run(run(args.chats, args.edits)):
+        print("❌ 发送队列行为不符合预期")
+        sys.exit(1)
+    print("✅ 发送队列行为符合预期")
+
+if __name__ == '__main__':
+    main()
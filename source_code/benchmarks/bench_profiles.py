@@ -0,0 +1,112 @@
+"""性能档位基准：在当前机器上依次以每个 PERF_PROFILE 运行端到端负载
+
+每个档位在独立的子进程中加载 bot.py（档位在导入时生效），运行 bench_e2e 的模拟用户负载，
+记录吞吐量、搜索 p95、缓存命中率和进程内存峰值。关键词池大于缓存容量，
+以体现不同档位缓存大小的取舍。
+
+自动选择的档位必须在它针对的指标上胜出（amd64 档位用更大的缓存换取命中率，
+arm64 档位缩小缓存和并发以节省内存），且吞吐量落后最佳档位不超过容差，否则以非零状态退出；
+分别在 amd64 和 arm64 机器上运行即可验证各自档位的默认值。
+
+用法: python bench_profiles.py [--users 50] [--rounds 4] [--keywords 300] [--items 200] [--tolerance 0.15]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+
+import bench_e2e
+
+# 档位 -> (针对的指标, 指标名称, 越大越好)
+PROFILE_GOALS = {
+    'amd64': ('hit_rate', '缓存命中率', True),
+    'arm64': ('rss_mb', '内存峰值', False),
+}
+
+def run_worker(args):
+    """子进程：以环境变量 PERF_PROFILE 指定的档位运行负载，最后一行输出 JSON 结果"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = asyncio.run(bench_e2e.run(args))
+    bot = sys.modules['bot']
+    cache = bot.search_cache.stats()
+    print(json.dumps({
+        'profile': bot.PERF_PROFILE,
+        'arch': bot.ARCH,
+        'native': bot.ARCH_PROFILES.get(bot.ARCH, 'amd64'),
+        'throughput': result['throughput'],
+        'search_p95_ms': result['actions']['search']['p95_ms'],
+        'hit_rate': cache['hit_rate'],
+        'cache_mb': cache['bytes'] / 1024 / 1024,
+        # Linux 上 ru_maxrss 的单位是 KB
+        'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'failures': result['failures'],
+    }))
+
+def run_profile(profile, argv):
+    env = dict(os.environ, PERF_PROFILE=profile)
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', *argv],
+                               env=env, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=4)
+    parser.add_argument('--keywords', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--items', type=int, default=200)
+    parser.add_argument('--recorded', default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--profiles', default='amd64,arm64')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='自动选择的档位允许落后最佳档位的吞吐量比例')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        run_worker(args)
+        return
+    
+    argv = [f'--{key}={value}' for key, value in vars(args).items()
+            if key in ('users', 'rounds', 'keywords', 'latency', 'items', 'seed')]
+    if args.recorded:
+        argv.append(f'--recorded={os.path.abspath(args.recorded)}')
+    results = [run_profile(profile.strip(), argv) for profile in args.profiles.split(',')]
+    
+    native = results[0]['native']
+    print(f"运行架构 {results[0]['arch']}，自动选择档位 {native}")
+    for r in results:
+        mark = ' *' if r['profile'] == native else ''
+        print(f"{r['profile'] + mark:<10} 吞吐量 {r['throughput']:7.1f} 操作/s  搜索 p95 {r['search_p95_ms']:8.1f}ms  "
+              f"缓存命中率 {r['hit_rate']:5.1%}  缓存 {r['cache_mb']:6.1f} MB  内存峰值 {r['rss_mb']:6.1f} MB")
+    
+    chosen = next((r for r in results if r['profile'] == native), None)
+    if chosen is None:
+        print(f"⚠️ 没有运行自动选择的档位 {native}")
+        return
+    ok = True
+    metric, metric_name, higher_is_better = PROFILE_GOALS[native]
+    pick = max if higher_is_better else min
+    winner = pick(results, key=lambda r: r[metric])
+    if winner[metric] != chosen[metric]:
+        print(f"❌ 档位 {native} 针对{metric_name}调优，但 {winner['profile']} 的{metric_name}更好"
+              f"（{winner[metric]:.3g} vs {chosen[metric]:.3g}）")
+        ok = False
+    else:
+        print(f"✅ 档位 {native} 的{metric_name}在所有档位中最好")
+    
+    best = max(results, key=lambda r: r['throughput'])
+    if chosen['throughput'] < best['throughput'] * (1 - args.tolerance):
+        print(f"❌ 档位 {native} 的吞吐量比 {best['profile']} 低 {1 - chosen['throughput'] / best['throughput']:.0%}")
+        ok = False
+    else:
+        print(f"✅ 档位 {native} 的吞吐量在最佳档位的 {args.tolerance:.0%} 以内")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
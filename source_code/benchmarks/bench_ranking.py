@@ -0,0 +1,93 @@
+"""结果去重与排序基准：compact_search_data 关闭 / 开启 RESULT_RANKING 的耗时和效果
+
+模拟多个频道和插件重复报告同一链接的情况：同一分享链接带不同的 www、末尾斜杠和提取码参数，
+同一磁力链接分别使用十六进制和 base32 的 btih。另外在接口顺序的末尾放入一条
+标题完全匹配、最新且被多个来源报告的资源，比较它排序前后所在的页码。
+
+用法: python bench_ranking.py [--items 500] [--repeat 20]
+"""
+import argparse
+import base64
+import random
+import time
+
+from common import load_bot, make_merged_by_type
+
+KEYWORD = '钢铁侠 Iron Man'
+
+def url_variant(rng, url):
+    """同一链接的另一种写法"""
+    if url.startswith('magnet:'):
+        btih = url.split('btih:')[1][:40]
+        if rng.random() < 0.5:
+            return f"magnet:?xt=urn:btih:{base64.b32encode(bytes.fromhex(btih)).decode()}"
+        return f"magnet:?xt=urn:btih:{btih.upper()}&tr=udp://tracker.example.com:80"
+    return rng.choice([
+        url.replace('https://', 'https://www.'),
+        url + '/',
+        url + '?pwd=abcd',
+        url + '#list/path=%2F',
+    ])
+
+def make_data(items_per_type, seed=42):
+    """生成带重复报告的结果集，返回 (data, 目标资源的链接)"""
+    rng = random.Random(seed)
+    merged_by_type = make_merged_by_type(items_per_type=items_per_type, seed=seed)
+    for resource_type, resources in merged_by_type.items():
+        duplicates = []
+        for item in resources:
+            for _ in range(rng.choice([0, 0, 1, 1, 2, 3])):
+                duplicates.append(dict(item, url=url_variant(rng, item['url']), source=f"tg:mirror{rng.randint(0, 9)}"))
+        resources.extend(duplicates)
+        rng.shuffle(resources)
+    
+    target = 'https://pan.example.com/quark/s/best'
+    merged_by_type['quark'].extend(
+        {'url': url, 'password': '', 'note': f"{KEYWORD} 4K 中英字幕", 'datetime': '2099-01-01T00:00:00Z', 'source': source, 'images': []}
+        for url, source in ((target, 'tg:channel0'), (target + '/', 'plugin:plugin0'), (target + '?pwd=abcd', 'tg:channel1'))
+    )
+    total = sum(len(resources) for resources in merged_by_type.values())
+    return {'total': total, 'merged_by_type': merged_by_type}, target
+
+def measure(build, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = build()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=500, help='每种资源类型的不同链接数')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    
+    bot = load_bot(LOG_LEVEL='WARNING')
+    data, target = make_data(args.items)
+    
+    def target_page(compact):
+        resources = compact['merged_by_type']['quark']
+        index = next(i for i, resource in enumerate(resources) if resource.url.startswith(target))
+        return index // bot.ITEMS_PER_PAGE + 1
+    
+    bot.RESULT_RANKING = False
+    plain, plain_time = measure(lambda: bot.compact_search_data(data, KEYWORD), args.repeat)
+    bot.RESULT_RANKING = True
+    # 按第一次从后端获取计时，包括更新来源统计
+    ranked, ranked_time = measure(lambda: bot.compact_search_data(data, KEYWORD, count_sources=True), args.repeat)
+    
+    count = data['total']
+    print(f"资源数量: {count}（{len(data['merged_by_type'])} 种类型），去重后 {ranked['total']} 条")
+    print(f"不排序: {plain_time * 1000:8.2f} ms  ({plain_time / count * 1e6:.2f} µs/条)")
+    print(f"去重排序: {ranked_time * 1000:8.2f} ms  ({ranked_time / count * 1e6:.2f} µs/条)")
+    print(f"目标资源所在页: 排序前第 {target_page(plain)} 页，排序后第 {target_page(ranked)} 页")
+    
+    assert target_page(ranked) == 1
+    # 每个链接在去重后只出现一次
+    for resources in ranked['merged_by_type'].values():
+        keys = [bot.canonical_url(resource.url) for resource in resources]
+        assert len(keys) == len(set(keys))
+
+if __name__ == '__main__':
+    main()
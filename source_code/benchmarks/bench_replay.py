@@ -0,0 +1,229 @@
+"""按日志回放真实的搜索关键词流
+
+从 logs/bot.log（JSON 行，包括轮转后的文件）或旧版文本日志中提取
+"用户 X 执行搜索，关键词: …" 记录及其时间（内联搜索按普通搜索回放），按记录的节奏（--speed 倍速）回放：
+- --target client：直接调用 bot.get_search_data，经过缓存、请求合并和并发控制后请求后端；
+- --target bot：通过 bot.build_application() 的真实处理器，以原用户身份发送消息（快速搜索先点击类型按钮）。
+
+后端默认为本地 FakePansou，--search-url 指定真实的 Pansou（账号取自 PANSOU_USERNAME/PANSOU_PASSWORD）。
+倍速回放时缓存 TTL 按倍速等比缩短。回放前会按 SEARCH_CACHE_TTL 分析关键词分布：不限容量时的理想命中率和需要的缓存条目数，供容量规划参考，
+并与关键词规范化之前（只合并空白、忽略大小写）的命中率比较。
+
+用法: python bench_replay.py logs/bot.log* [--speed 10] [--target client|bot] [--limit 0]
+                            [--search-url URL] [--latency 0.2] [--analyze-only]
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime
+
+from telegram import Update
+
+from common import FakeBotAPI, FakePansou, Timer, load_bot
+
+# 文本日志格式: '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+TEXT_PATTERN = re.compile(
+    r'^(?P<ts>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - \S+ - \w+ - '
+    r'🎯 用户 (?P<user_id>\d+) 执行(?:快速)?搜索(?:\((?P<resource_type>\w+)\))?，关键词: (?P<keyword>.*)$'
+)
+
+def parse_line(line):
+    """解析一行日志，返回 (时间戳, 用户ID, 关键词, 网盘类型)，不是搜索记录时返回 None"""
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        if entry.get('event') not in ('search', 'quick_search', 'inline_search'):
+            return None
+        ts = datetime.strptime(entry['ts'], '%Y-%m-%dT%H:%M:%S.%f%z').timestamp()
+        return ts, int(entry['user_id']), entry['keyword'], entry.get('resource_type')
+    
+    match = TEXT_PATTERN.match(line)
+    if match is None:
+        return None
+    ts = datetime.strptime(match['ts'], '%Y-%m-%d %H:%M:%S,%f').timestamp()
+    return ts, int(match['user_id']), match['keyword'], match['resource_type']
+
+def load_events(paths):
+    """读取所有日志文件中的搜索记录，按时间排序"""
+    events = []
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                event = parse_line(line)
+                if event is not None:
+                    events.append(event)
+    events.sort(key=lambda event: event[0])
+    return events
+
+def legacy_cache_key(keyword, resource_type):
+    """关键词规范化之前的缓存键：只合并空白并忽略大小写"""
+    cache_key = ' '.join(keyword.split()).casefold()
+    return f"{cache_key}|{resource_type}" if resource_type else cache_key
+
+def simulate_ttl_cache(events, keys, ttl):
+    """模拟不限容量、只按 TTL 过期的缓存，返回 (命中次数, 条目峰值)"""
+    expires = {}
+    live = []  # (过期时间, 键) 小顶堆
+    hits = peak = 0
+    for (ts, _, _, _), key in zip(events, keys):
+        while live and live[0][0] <= ts:
+            expired_at, expired_key = heapq.heappop(live)
+            if expires.get(expired_key) == expired_at:
+                del expires[expired_key]
+        if key in expires:
+            hits += 1
+            continue
+        expires[key] = ts + ttl
+        heapq.heappush(live, (ts + ttl, key))
+        peak = max(peak, len(expires))
+    return hits, peak
+
+def analyze(bot, events, ttl):
+    """按缓存键统计关键词分布，并比较关键词规范化前后的理想命中率"""
+    keys = [bot.search_cache_key(keyword, resource_type) for _, _, keyword, resource_type in events]
+    counts = Counter(keys)
+    hits, peak = simulate_ttl_cache(events, keys, ttl)
+    legacy_keys = [legacy_cache_key(keyword, resource_type) for _, _, keyword, resource_type in events]
+    legacy_hits, _ = simulate_ttl_cache(events, legacy_keys, ttl)
+    
+    duration = events[-1][0] - events[0][0] if events else 0
+    print(f"搜索记录 {len(events)} 条, 用户 {len({event[1] for event in events})} 个, 不同缓存键 {len(counts)} 个, 时间跨度 {duration / 3600:.1f} 小时")
+    if duration:
+        print(f"平均 {len(events) / duration * 60:.2f} 次/分钟")
+    top = counts.most_common(10)
+    top_share = sum(count for _, count in top) / len(events) if events else 0
+    print(f"前 10 个关键词占 {top_share:.1%}: " + ", ".join(f"{key}({count})" for key, count in top))
+    print(f"TTL {ttl}s 下理想命中率 {hits / len(events) if events else 0:.1%}，需要缓存条目峰值 {peak} 个（当前上限 {bot.SEARCH_CACHE_MAX_ENTRIES}）")
+    print(f"关键词规范化: 不同缓存键 {len(set(legacy_keys))} -> {len(counts)} 个, "
+          f"理想命中率 {legacy_hits / len(events) if events else 0:.1%} -> {hits / len(events) if events else 0:.1%}"
+          f"{'（已开启繁体转简体）' if bot.KEYWORD_T2S else ''}")
+
+class Replayer:
+    """按时间表把搜索事件发送到 client 或 bot"""
+    
+    def __init__(self, bot, target, application=None):
+        self.bot = bot
+        self.target = target
+        self.application = application
+        self.timer = Timer(f'{target} 搜索')
+        self.lag = Timer('调度延迟')
+        self.errors = Counter()
+        self.update_id = 0
+    
+    def make_update(self, user_id, text=None, callback_data=None):
+        self.update_id += 1
+        user = {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}
+        message = {'message_id': self.update_id, 'date': int(time.time()), 'chat': {'id': user_id, 'type': 'private'}, 'from': user}
+        if callback_data is None:
+            update = {'update_id': self.update_id, 'message': dict(message, text=text)}
+        else:
+            update = {'update_id': self.update_id, 'callback_query': {
+                'id': str(self.update_id), 'from': user, 'chat_instance': str(user_id), 'data': callback_data, 'message': message,
+            }}
+        return Update.de_json(update, self.application.bot)
+    
+    async def send(self, user_id, keyword, resource_type):
+        start = time.perf_counter()
+        try:
+            if self.target == 'client':
+                await self.bot.get_search_data(keyword, resource_type)
+            else:
+                if resource_type:
+                    await self.application.process_update(self.make_update(user_id, callback_data=self.bot.encode_callback('Q', resource_type=resource_type)))
+                await self.application.process_update(self.make_update(user_id, text=keyword))
+        except self.bot.SearchError as e:
+            self.errors[type(e).__name__] += 1
+        self.timer.samples.append(time.perf_counter() - start)
+    
+    async def replay(self, events, speed):
+        """speed 为回放倍速，0 表示不等待、一次性发出全部请求"""
+        tasks = []
+        start = time.perf_counter()
+        first_ts = events[0][0]
+        for ts, user_id, keyword, resource_type in events:
+            if speed > 0:
+                due = start + (ts - first_ts) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.lag.samples.append(max(time.perf_counter() - due, 0))
+            tasks.append(asyncio.create_task(self.send(user_id, keyword, resource_type)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+async def run(args, events):
+    pansou = None
+    env = {'RATE_LIMIT_RATE': 0, 'LOG_LEVEL': 'WARNING'}
+    if args.search_url:
+        env['SEARCH_API_URL'] = args.search_url
+    else:
+        pansou = FakePansou(latency=args.latency, items_per_type=args.items)
+        env['SEARCH_API_URL'] = pansou.search_url
+    if args.target == 'bot':
+        env['TELEGRAM_BASE_URL'] = FakeBotAPI().base_url
+    # 倍速回放时按比例缩短缓存 TTL，使命中率与原始流量一致
+    ttl = int(os.getenv('SEARCH_CACHE_TTL', '600'))
+    if args.speed > 1:
+        env['SEARCH_CACHE_TTL'] = max(1, round(ttl / args.speed))
+    bot = load_bot(**env)
+    
+    analyze(bot, events, ttl)
+    if args.analyze_only:
+        return
+    
+    application = None
+    if args.target == 'bot':
+        application = bot.build_application()
+        await application.initialize()
+    
+    replayer = Replayer(bot, args.target, application)
+    try:
+        elapsed = await replayer.replay(events, args.speed)
+    finally:
+        if application is not None:
+            await application.shutdown()
+        await bot.shutdown(application)
+    
+    print(f"回放 {len(events)} 次搜索（{args.speed:g} 倍速）耗时 {elapsed:.2f}s, {len(events) / elapsed:.1f} 次/s")
+    replayer.timer.report()
+    if args.speed > 0:
+        replayer.lag.report()
+    cache = bot.search_cache.stats()
+    print(f"搜索缓存: 命中率 {cache['hit_rate']:.1%}, 条目 {cache['entries']}, 淘汰 {cache['evictions']}, 合并请求 {bot.search_stats['coalesced']} 次")
+    admission = bot.backend_admission.stats()
+    print(f"后端并发控制: 放行 {admission['admitted']} 次, 拒绝 {admission['shed']} 次, 排队超时 {admission['timeouts']} 次, 最长等待 {admission['max_wait'] * 1000:.0f}ms")
+    if pansou is not None:
+        print(f"后端请求: 登录 {pansou.counts['login']} 次, 搜索 {pansou.counts['search']} 次")
+    if replayer.errors:
+        print(f"⚠️ 搜索失败: {dict(replayer.errors)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('logs', nargs='+', help='日志文件（可包括轮转后的文件）')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放倍速，0 表示一次性发出全部请求')
+    parser.add_argument('--target', choices=('client', 'bot'), default='client')
+    parser.add_argument('--limit', type=int, default=0, help='只回放前 N 条记录，0 表示全部')
+    parser.add_argument('--search-url', default=None, help='真实 Pansou 的搜索接口地址，不指定时使用本地模拟后端')
+    parser.add_argument('--latency', type=float, default=0.2, help='模拟后端的搜索延迟（秒）')
+    parser.add_argument('--items', type=int, default=50, help='模拟后端每种网盘类型的结果数')
+    parser.add_argument('--analyze-only', action='store_true', help='只分析关键词分布，不回放')
+    args = parser.parse_args()
+    
+    events = load_events(args.logs)
+    if args.limit:
+        events = events[:args.limit]
+    if not events:
+        print("❌ 日志中没有搜索记录")
+        return
+    asyncio.run(run(args, events))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""搜索结果内存占用基准：接口原始字典 vs 紧凑的 Resource 表示
+
+用法: python bench_result_memory.py [--recorded response.json] [--items 2000]
+--recorded 指定录制的 /api/search 响应（完整 JSON），不指定时使用模拟数据。
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+
+from common import load_bot, load_recorded_data, make_merged_by_type
+
+def measure(build):
+    """返回 build() 结果在内存中占用的字节数"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return result, size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recorded', help='录制的 /api/search 响应文件')
+    parser.add_argument('--items', type=int, default=2000, help='模拟数据中每种资源类型的数量')
+    args = parser.parse_args()
+    
+    bot = load_bot()
+    
+    if args.recorded:
+        data = load_recorded_data(args.recorded)
+    else:
+        merged_by_type = make_merged_by_type(items_per_type=args.items)
+        data = {'total': sum(len(resources) for resources in merged_by_type.values()), 'merged_by_type': merged_by_type}
+    body = json.dumps({'code': 0, 'message': 'success', 'data': data}, ensure_ascii=False).encode()
+    del data
+    
+    raw, raw_size = measure(lambda: json.loads(body)['data'])
+    del raw
+    # 紧凑表示同样从响应解析，解析用的临时字典释放后只保留 Resource 及其字符串
+    compact, compact_size = measure(lambda: bot.compact_search_data(json.loads(body)['data']))
+    
+    count = sum(len(resources) for resources in compact['merged_by_type'].values())
+    print(f"资源数量: {count}, 响应大小: {len(body) / 1024 / 1024:.2f} MB")
+    print(f"原始字典:   {raw_size / 1024 / 1024:8.2f} MB  ({raw_size / count:.0f} 字节/条)")
+    print(f"紧凑表示:   {compact_size / 1024 / 1024:8.2f} MB  ({compact_size / count:.0f} 字节/条)")
+    print(f"节省:       {1 - compact_size / raw_size:8.1%}")
+
+if __name__ == '__main__':
+    main()
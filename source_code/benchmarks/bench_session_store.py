@@ -0,0 +1,75 @@
+"""会话翻页延迟基准：内存中的热会话 vs 只在 SQLite 中的冷会话
+
+用法: python bench_session_store.py [--items 2000] [--turns 500]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from common import StubQuery, Timer, load_bot, make_merged_by_type
+
+async def run(items, turns):
+    db_path = os.path.join(tempfile.mkdtemp(prefix='pansou-db-'), 'bot.db')
+    bot = load_bot(SESSION_DB_PATH=db_path)
+    
+    raw = make_merged_by_type(items_per_type=items)
+    data = bot.compact_search_data({'total': sum(len(resources) for resources in raw.values()), 'merged_by_type': raw})
+    merged_by_type = data['merged_by_type']
+    total = data['total']
+    user_id = 1
+    session = bot.build_session('钢铁侠', merged_by_type, total, data['id'])
+    
+    store = Timer('保存会话到 SQLite')
+    with store.time():
+        bot.session_db.save_session(user_id, session, time.time())
+    bot.session_store.set(user_id, session)
+    
+    rng = random.Random(1)
+    pages = [(resource_type, rng.randrange((items - 1) // bot.ITEMS_PER_PAGE + 1)) for resource_type in rng.choices(list(merged_by_type), k=turns)]
+    
+    hot = Timer('热会话翻页 (内存)')
+    for resource_type, page in pages:
+        with hot.time():
+            user_data = await bot.get_session(user_id)
+            await bot.show_resource_page(StubQuery(), user_data, resource_type, page, user_id, None)
+    
+    # 统计冷会话翻页实际从 SQLite 读取的次数
+    load_page = bot.session_db.load_page
+    page_loads = []
+    def counting_load_page(*args):
+        page_loads.append(args)
+        return load_page(*args)
+    bot.session_db.load_page = counting_load_page
+    
+    cold = Timer('冷会话翻页 (SQLite)')
+    for resource_type, page in pages:
+        # 模拟重启：清空内存中的会话和已渲染页，只能从磁盘按页读取
+        bot.session_store.sessions.clear()
+        bot.session_store.shared.clear()
+        bot.session_store.total_bytes = 0
+        bot.page_cache.invalidate(data['id'])
+        query = StubQuery()
+        with cold.time():
+            user_data = await bot.get_session(user_id)
+            await bot.show_resource_page(query, user_data, resource_type, page, user_id, None)
+        assert user_data['merged_by_type'] is None and query.text.startswith('🔍'), query.text
+    
+    assert len(page_loads) == len(pages), f"冷会话只从 SQLite 读取了 {len(page_loads)} 页"
+    
+    print(f"会话大小: {total} 个资源, {len(pages)} 次翻页")
+    for timer in (store, hot, cold):
+        timer.report()
+    bot.session_db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=2000, help='每种资源类型的数量')
+    parser.add_argument('--turns', type=int, default=500, help='翻页次数')
+    args = parser.parse_args()
+    asyncio.run(run(args.items, args.turns))
+
+if __name__ == '__main__':
+    main()
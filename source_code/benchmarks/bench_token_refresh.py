@@ -0,0 +1,49 @@
+"""Token 刷新检查：并发搜索只触发一次登录
+
+对本地模拟的 Pansou 后端直接调用 bot.search_api（绕过搜索缓存和请求合并）：
+1. 启动后还没有 Token 时同时发起 N 个搜索，只能登录一次；
+2. 后端让所有 Token 失效（搜索返回 401）后再同时发起 N 个搜索，只能再登录一次。
+所有搜索都必须成功，任何一项不符合预期时以非零状态退出。
+
+用法: python bench_token_refresh.py [--searches 100]
+"""
+import argparse
+import asyncio
+import sys
+
+from common import FakePansou, load_bot
+
+async def concurrent_searches(bot, pansou, searches, name):
+    """同时发起 searches 个不同关键词的搜索，返回是否只登录了一次且全部成功"""
+    logins = pansou.counts['login']
+    responses = await asyncio.gather(*[bot.search_api(f"关键词{i}") for i in range(searches)])
+    ok_count = sum(response is not None and response.status_code == 200 for response in responses)
+    logins = pansou.counts['login'] - logins
+    print(f"{name}: {searches} 个并发搜索 -> 登录 {logins} 次, 成功 {ok_count} 个")
+    return logins == 1 and ok_count == searches
+
+async def run(args):
+    pansou = FakePansou(latency=0.01, items_per_type=2)
+    bot = load_bot(SEARCH_API_URL=pansou.search_url, LOG_LEVEL='ERROR')
+    try:
+        ok = await concurrent_searches(bot, pansou, args.searches, '冷启动')
+        # 后端重启等情况：已签发的 Token 全部失效
+        with pansou.lock:
+            pansou.tokens.clear()
+        ok &= await concurrent_searches(bot, pansou, args.searches, 'Token 失效')
+    finally:
+        await bot.close_http_client()
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--searches', type=int, default=100)
+    args = parser.parse_args()
+    
+    if not asyncio.run(run(args)):
+        print("❌ 并发搜索触发了多次登录或有搜索失败")
+        sys.exit(1)
+    print("✅ 并发搜索只登录了一次")
+
+if __name__ == '__main__':
+    main()
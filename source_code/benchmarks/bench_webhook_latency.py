@@ -0,0 +1,126 @@
+"""更新到回复的延迟基准：长轮询 vs webhook
+
+在本地启动一个模拟的 Telegram Bot API，分别以 polling 和 webhook 模式运行 bot.py，
+逐条投递 /start 更新，并记录从投递到模拟 API 收到 sendMessage 的耗时。
+webhook 模式下还会验证错误的 secret token 会被拒绝。
+
+用法: python bench_webhook_latency.py [--updates 200] [--modes polling,webhook]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from common import BOT_PATH, FakeBotAPI, Timer
+
+WEBHOOK_SECRET = 'bench-secret'
+
+def make_update(update_id):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': update_id, 'type': 'private'},
+            'from': {'id': update_id, 'is_bot': False, 'first_name': 'bench'},
+            'text': '/start',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+        },
+    }
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def post_update(url, update, secret=WEBHOOK_SECRET):
+    request = urllib.request.Request(url, data=json.dumps(update).encode(), headers={
+        'Content-Type': 'application/json',
+        'X-Telegram-Bot-Api-Secret-Token': secret,
+    })
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.status
+
+def start_bot(api, mode):
+    workdir = tempfile.mkdtemp(prefix='pansou-bench-')
+    os.makedirs(os.path.join(workdir, 'logs'), exist_ok=True)
+    port = free_port()
+    env = dict(os.environ,
+               BOT_TOKEN='123456:bench',
+               SEARCH_API_URL='http://127.0.0.1:9/api/search',
+               PANSOU_USERNAME='bench',
+               PANSOU_PASSWORD='bench',
+               SESSION_DB_PATH='',
+               TELEGRAM_BASE_URL=api.base_url,
+               BOT_MODE=mode,
+               WEBHOOK_URL=f"http://127.0.0.1:{port}",
+               WEBHOOK_LISTEN='127.0.0.1',
+               WEBHOOK_PORT=str(port),
+               WEBHOOK_SECRET=WEBHOOK_SECRET)
+    process = subprocess.Popen([sys.executable, os.path.abspath(BOT_PATH)], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return process, f"http://127.0.0.1:{port}/telegram"
+
+def wait_ready(api, mode, webhook_url, process, timeout=30):
+    """发送探测更新，直到 bot 开始回复"""
+    deadline = time.time() + timeout
+    probe_id = 1
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"bot 进程已退出，返回码 {process.returncode}")
+        try:
+            if mode == 'webhook':
+                post_update(webhook_url, make_update(probe_id))
+            else:
+                api.push_update(make_update(probe_id))
+            api.wait_reply(probe_id, timeout=1)
+            return probe_id + 1
+        except (OSError, TimeoutError):
+            probe_id += 1
+            time.sleep(0.2)
+    raise RuntimeError("bot 启动超时")
+
+def run_mode(mode, updates):
+    api = FakeBotAPI()
+    process, webhook_url = start_bot(api, mode)
+    try:
+        next_id = wait_ready(api, mode, webhook_url, process)
+        
+        if mode == 'webhook':
+            try:
+                post_update(webhook_url, make_update(next_id), secret='wrong')
+                raise AssertionError("错误的 secret token 没有被拒绝")
+            except urllib.error.HTTPError as e:
+                assert e.code == 403, e.code
+            next_id += 1
+        
+        timer = Timer(f'{mode} 更新→回复')
+        for update_id in range(next_id, next_id + updates):
+            start = time.perf_counter()
+            if mode == 'webhook':
+                post_update(webhook_url, make_update(update_id))
+            else:
+                api.push_update(make_update(update_id))
+            timer.samples.append(api.wait_reply(update_id) - start)
+        return timer
+    finally:
+        process.terminate()
+        process.wait(timeout=15)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=200)
+    parser.add_argument('--modes', default='polling,webhook')
+    args = parser.parse_args()
+    
+    for mode in args.modes.split(','):
+        run_mode(mode.strip(), args.updates).report()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+"""基准测试公共工具
+
+以测试配置加载 bot.py（不会连接 Telegram），并提供计时统计和模拟数据。
+通过环境变量 PERF_PROFILE 可以指定 bot.py 使用的性能档位。
+"""
+import base64
+import glob
+import importlib.util
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BOT_PATH = os.path.join(BENCH_DIR, '..', 'bot.py')
+
+def load_bot(**env):
+    """在临时工作目录中加载 bot 模块，env 会覆盖对应的环境变量"""
+    workdir = tempfile.mkdtemp(prefix='pansou-bench-')
+    os.makedirs(os.path.join(workdir, 'logs'), exist_ok=True)
+    os.chdir(workdir)
+    
+    os.environ.setdefault('BOT_TOKEN', '123456:bench')
+    os.environ.setdefault('SEARCH_API_URL', 'http://127.0.0.1:9/api/search')
+    os.environ.setdefault('PANSOU_USERNAME', 'bench')
+    os.environ.setdefault('PANSOU_PASSWORD', 'bench')
+    os.environ.setdefault('SESSION_DB_PATH', '')
+    # 基准测试衡量处理耗时，不模拟 Telegram 的发送速率限制
+    os.environ.setdefault('OUTBOUND_CHAT_RATE', '0')
+    os.environ.setdefault('OUTBOUND_GLOBAL_RATE', '0')
+    os.environ.update({key: str(value) for key, value in env.items()})
+    
+    spec = importlib.util.spec_from_file_location('bot', BOT_PATH)
+    bot = importlib.util.module_from_spec(spec)
+    sys.modules['bot'] = bot
+    spec.loader.exec_module(bot)
+    return bot
+
+def make_merged_by_type(items_per_type=1000, resource_types=('magnet', 'quark', 'baidu', 'aliyun', 'xunlei', '115'), seed=42):
+    """生成与 Pansou merged_by_type 结构相同的模拟数据"""
+    rng = random.Random(seed)
+    sources = [f"tg:channel{i}" for i in range(40)] + [f"plugin:plugin{i}" for i in range(30)]
+    merged_by_type = {}
+    for resource_type in resource_types:
+        resources = []
+        for i in range(items_per_type):
+            if resource_type == 'magnet':
+                url = f"magnet:?xt=urn:btih:{rng.getrandbits(160):040x}&dn=item{i}"
+            else:
+                url = f"https://pan.example.com/{resource_type}/s/{rng.getrandbits(64):016x}"
+            resources.append({
+                'url': url,
+                'password': rng.choice(['', '', 'abcd', '1234']),
+                'note': f"钢铁侠 Iron Man {i} 4K 高码率 中英字幕 {rng.getrandbits(32):08x}",
+                'datetime': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00Z",
+                'source': rng.choice(sources),
+                'images': [],
+            })
+        merged_by_type[resource_type] = resources
+    return merged_by_type
+
+def load_recorded_data(path):
+    """读取录制的 /api/search 响应，返回其中的 data 部分"""
+    with open(path, encoding='utf-8') as f:
+        result = json.load(f)
+    return result.get('data', result)
+
+class Timer:
+    """收集耗时样本并输出统计"""
+    
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+    
+    def time(self):
+        timer = self
+        
+        class _Span:
+            def __enter__(self):
+                self.start = time.perf_counter()
+            
+            def __exit__(self, *exc):
+                timer.samples.append(time.perf_counter() - self.start)
+        
+        return _Span()
+    
+    def percentile(self, p):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+    
+    def summary(self):
+        return {
+            'count': len(self.samples),
+            'mean_ms': statistics.fmean(self.samples) * 1000 if self.samples else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+        }
+    
+    def report(self):
+        s = self.summary()
+        print(f"{self.name:<28} n={s['count']:<6} mean={s['mean_ms']:8.3f}ms  p50={s['p50_ms']:8.3f}ms  p95={s['p95_ms']:8.3f}ms  p99={s['p99_ms']:8.3f}ms")
+
+class StubQuery:
+    """模拟内联消息的 CallbackQuery，只记录编辑内容，不访问 Telegram"""
+    
+    def __init__(self, user_id=1):
+        self.text = None
+        self.reply_markup = None
+        self.message = None
+        self.inline_message_id = f"bench-{user_id}"
+        self.from_user = type('User', (), {'id': user_id})()
+    
+    async def answer(self, *args, **kwargs):
+        pass
+    
+    async def edit_message_text(self, text, reply_markup=None, **kwargs):
+        self.text = text
+        self.reply_markup = reply_markup
+
+class FakeBotAPI:
+    """本地模拟的 Telegram Bot API
+
+    支持 getUpdates 长轮询和 setWebhook，记录每次 sendMessage/editMessageText 的到达时间，
+    flood(n, retry_after) 让接下来的 n 次发送返回 429。
+    """
+    
+    def __init__(self):
+        self.updates = deque()
+        self.replies = {}
+        self.last_params = {}  # 每个聊天最近一次发送/编辑的参数
+        self.calls = []  # (到达时间, 方法, 参数)
+        self.cond = threading.Condition()
+        self.webhook_url = None
+        self.flood_remaining = 0
+        self.flood_retry_after = 1
+        self.message_ids = itertools.count(1)
+        api = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+            
+            def log_message(self, *args):
+                pass
+            
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length)
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    params = json.loads(body or b'{}')
+                else:
+                    params = dict(parse_qsl(body.decode()))
+                method = self.path.rsplit('/', 1)[-1]
+                status, payload = api.dispatch(method, params)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            do_GET = do_POST
+        
+        ThreadingHTTPServer.request_queue_size = 512
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+    
+    def flood(self, count, retry_after=1):
+        with self.cond:
+            self.flood_remaining = count
+            self.flood_retry_after = retry_after
+    
+    def dispatch(self, method, params):
+        if method in ('sendMessage', 'editMessageText'):
+            with self.cond:
+                self.calls.append((time.perf_counter(), method, params))
+                if self.flood_remaining > 0:
+                    self.flood_remaining -= 1
+                    return 429, {
+                        'ok': False,
+                        'error_code': 429,
+                        'description': f"Too Many Requests: retry after {self.flood_retry_after}",
+                        'parameters': {'retry_after': self.flood_retry_after},
+                    }
+        return 200, {'ok': True, 'result': self.handle(method, params)}
+    
+    def handle(self, method, params):
+        if method == 'getMe':
+            return {'id': 123456, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        if method == 'getUpdates':
+            offset = int(params.get('offset') or 0)
+            timeout = float(params.get('timeout') or 0)
+            with self.cond:
+                while self.updates and self.updates[0]['update_id'] < offset:
+                    self.updates.popleft()
+                if not self.updates:
+                    self.cond.wait(timeout)
+                return [update for update in self.updates if update['update_id'] >= offset]
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url')
+            return True
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params['chat_id'])
+            with self.cond:
+                self.replies[chat_id] = time.perf_counter()
+                self.last_params[chat_id] = params
+                self.cond.notify_all()
+            return {
+                'message_id': int(params.get('message_id') or next(self.message_ids)),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        return True
+    
+    def push_update(self, update):
+        with self.cond:
+            self.updates.append(update)
+            self.cond.notify_all()
+    
+    def wait_reply(self, chat_id, timeout=10):
+        deadline = time.perf_counter() + timeout
+        with self.cond:
+            while chat_id not in self.replies:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise TimeoutError(f"chat {chat_id} 未收到回复")
+                self.cond.wait(remaining)
+            return self.replies.pop(chat_id)
+
+class FakePansou:
+    """本地模拟的 Pansou 后端
+
+    提供 /api/auth/login、/api/auth/verify 和 /api/search。搜索在 latency 秒后返回
+    merged_by_type：recorded 为录制响应的文件或目录（目录中按文件名匹配关键词，
+    其余关键词轮流使用），否则按 items_per_type 生成。签发的 JWT 在 token_ttl 秒后过期。
+    """
+    
+    def __init__(self, latency=0.0, items_per_type=50, recorded=None, token_ttl=3600):
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.tokens = {}
+        self.counts = {'login': 0, 'verify': 0, 'search': 0, 'unauthorized': 0}
+        self.lock = threading.Lock()
+        self.encoded = {}
+        
+        if recorded and os.path.isdir(recorded):
+            paths = sorted(glob.glob(os.path.join(recorded, '*.json')))
+            self.recorded = {os.path.splitext(os.path.basename(path))[0]: load_recorded_data(path) for path in paths}
+        elif recorded:
+            self.recorded = {'': load_recorded_data(recorded)}
+        else:
+            self.recorded = {'': {'merged_by_type': make_merged_by_type(items_per_type)}}
+        self.recorded_keys = list(self.recorded)
+        pansou = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+            
+            def log_message(self, *args):
+                pass
+            
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                params = json.loads(self.rfile.read(length) or b'{}')
+                status, data = pansou.dispatch(self.path.split('?')[0], params, self.headers.get('Authorization', ''))
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            do_GET = do_POST
+        
+        ThreadingHTTPServer.request_queue_size = 512
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.search_url = f"{self.base_url}/api/search"
+    
+    def issue_token(self):
+        """签发与 Pansou 格式相同的 JWT（只有 exp 有意义，签名不校验）"""
+        expires_at = int(time.time()) + self.token_ttl
+        encode = lambda obj: base64.urlsafe_b64encode(json.dumps(obj).encode()).rstrip(b'=').decode()
+        token = f"{encode({'alg': 'HS256', 'typ': 'JWT'})}.{encode({'exp': expires_at, 'jti': os.urandom(8).hex()})}.bench"
+        with self.lock:
+            self.tokens[token] = expires_at
+        return token
+    
+    def token_valid(self, authorization):
+        token = authorization.removeprefix('Bearer ').strip()
+        with self.lock:
+            return self.tokens.get(token, 0) > time.time()
+    
+    def dispatch(self, path, params, authorization):
+        if path == '/api/auth/login':
+            with self.lock:
+                self.counts['login'] += 1
+            return 200, json.dumps({'token': self.issue_token(), 'expires_at': int(time.time()) + self.token_ttl}).encode()
+        if path == '/api/auth/verify':
+            with self.lock:
+                self.counts['verify'] += 1
+            return 200, json.dumps({'valid': self.token_valid(authorization)}).encode()
+        if path == '/api/search':
+            if not self.token_valid(authorization):
+                with self.lock:
+                    self.counts['unauthorized'] += 1
+                return 401, json.dumps({'error': '未授权'}).encode()
+            if self.latency:
+                time.sleep(self.latency)
+            with self.lock:
+                self.counts['search'] += 1
+            return 200, self.search_response(params.get('kw', ''), params.get('cloud_types'), params.get('src'))
+        return 404, json.dumps({'error': '未知接口'}).encode()
+    
+    def search_response(self, keyword, cloud_types=None, src=None):
+        """按关键词选择录制数据并按类型和来源过滤，编码结果按参数缓存"""
+        if keyword in self.recorded:
+            recorded_key = keyword
+        else:
+            recorded_key = self.recorded_keys[sum(keyword.encode()) % len(self.recorded_keys)]
+        key = (recorded_key, tuple(cloud_types or ()), src)
+        data = self.encoded.get(key)
+        if data is not None:
+            return data
+        
+        merged_by_type = {}
+        for resource_type, resources in self.recorded[recorded_key].get('merged_by_type', {}).items():
+            if cloud_types and resource_type not in cloud_types:
+                continue
+            if src in ('tg', 'plugin'):
+                resources = [r for r in resources if r.get('source', '').startswith(f"{src}:")]
+            if resources:
+                merged_by_type[resource_type] = resources
+        total = sum(len(resources) for resources in merged_by_type.values())
+        data = json.dumps({'code': 0, 'message': 'success', 'data': {'total': total, 'merged_by_type': merged_by_type}}, ensure_ascii=False).encode()
+        self.encoded[key] = data
+        return data
@@ -0,0 +1,2897 @@
+import httpx
+import json
+import logging
+import logging.handlers
+import asyncio
+import os
+import sys
+import queue
+import atexit
+import platform
+import time
+import base64
+import functools
+import heapq
+import binascii
+import uuid
+import sqlite3
+import re
+import struct
+import threading
+import unicodedata
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from operator import itemgetter
+from urllib.parse import urlparse, urlunparse
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler, InlineQueryHandler
+from telegram.error import BadRequest, RetryAfter
+from prometheus_client import CollectorRegistry, Counter, Histogram, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# === 运行架构与性能档位 ===
+# 启动时按 platform.machine() 选择一组调优过的默认参数，PERF_PROFILE 可强制指定档位；
+# 档位中的每一项仍可用同名环境变量单独覆盖
+ARCH = platform.machine().lower()
+ARCH_PROFILES = {
+    'x86_64': 'amd64', 'amd64': 'amd64',
+    'aarch64': 'arm64', 'arm64': 'arm64', 'armv8': 'arm64', 'armv8l': 'arm64',
+}
+PERF_PROFILES = {
+    'amd64': {
+        'LOG_LEVEL': 'INFO',
+        'HTTP_CONNECT_TIMEOUT': '5',
+        'AUTH_READ_TIMEOUT': '10',
+        'SEARCH_READ_TIMEOUT': '30',
+        'HTTP_POOL_SIZE': '20',
+        'HTTP_KEEPALIVE_CONNECTIONS': '10',
+        'SEARCH_CACHE_MAX_ENTRIES': '200',
+        'SEARCH_CACHE_MAX_BYTES': str(64 * 1024 * 1024),
+        'PAGE_CACHE_MAX_ENTRIES': '2000',
+        'SESSION_MAX_BYTES': str(128 * 1024 * 1024),
+        'DB_WORKERS': '2',
+        'CONCURRENT_UPDATES': '64',
+    },
+    # ARM 设备（树莓派、ARM VPS）单核较慢、内存较小：放宽超时，缩小缓存、连接池和并发
+    'arm64': {
+        'LOG_LEVEL': 'INFO',
+        'HTTP_CONNECT_TIMEOUT': '10',
+        'AUTH_READ_TIMEOUT': '15',
+        'SEARCH_READ_TIMEOUT': '45',
+        'HTTP_POOL_SIZE': '10',
+        'HTTP_KEEPALIVE_CONNECTIONS': '5',
+        'SEARCH_CACHE_MAX_ENTRIES': '100',
+        'SEARCH_CACHE_MAX_BYTES': str(32 * 1024 * 1024),
+        'PAGE_CACHE_MAX_ENTRIES': '1000',
+        'SESSION_MAX_BYTES': str(64 * 1024 * 1024),
+        'DB_WORKERS': '1',
+        'CONCURRENT_UPDATES': '32',
+    },
+}
+PERF_PROFILE = os.getenv('PERF_PROFILE', '').strip().lower() or ARCH_PROFILES.get(ARCH, 'amd64')
+if PERF_PROFILE not in PERF_PROFILES:
+    raise Exception(f"PERF_PROFILE 只能是 {' 或 '.join(PERF_PROFILES)}，当前为: {PERF_PROFILE}")
+
+def perf_setting(name):
+    """读取性能参数：环境变量优先，否则使用当前档位的默认值"""
+    return os.getenv(name, PERF_PROFILES[PERF_PROFILE][name])
+
+# === 日志配置 ===
+# 处理函数只把日志放入内存队列，由后台线程格式化后写到控制台和日志文件，不会因磁盘或标准输出阻塞
+LOG_LEVEL = perf_setting('LOG_LEVEL').upper()
+LOG_FILE = os.getenv('LOG_FILE', 'logs/bot.log')
+# 日志文件按时间轮转（默认每天午夜），超过 LOG_MAX_BYTES 时提前轮转
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', 'midnight')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '7'))
+# 队列满时直接丢弃日志，而不是让处理函数等待
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+# 同一行日志代码每秒最多输出的条数（WARNING 及以上不受限），0 表示不采样
+LOG_SAMPLE_BURST = int(os.getenv('LOG_SAMPLE_BURST', '20'))
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON，通过 extra 传入的字段作为独立字段输出"""
+    
+    RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+    
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f".{int(record.msecs):03d}" + time.strftime('%z', time.localtime(record.created)),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in self.RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """按时间轮转的日志文件，单个文件超过 max_bytes 时也会提前轮转"""
+    
+    def __init__(self, filename, max_bytes, **kwargs):
+        super().__init__(filename, encoding='utf-8', **kwargs)
+        self.max_bytes = max_bytes
+    
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        return self.max_bytes > 0 and self.stream is not None and self.stream.tell() >= self.max_bytes
+    
+    def rotation_filename(self, default_name):
+        # 同一时间段内多次按大小轮转时依次加上序号，避免覆盖之前的文件
+        name = default_name
+        index = 1
+        while os.path.exists(name):
+            name = f"{default_name}.{index:03d}"
+            index += 1
+        return name
+
+class SamplingFilter(logging.Filter):
+    """高频日志采样：同一行日志代码每秒最多放行 burst 条，其余丢弃并计数
+
+    带 event 字段的结构化日志（如搜索记录）不采样，保证可以完整回放。
+    """
+    
+    def __init__(self, burst):
+        super().__init__()
+        self.burst = burst
+        self.windows = {}  # (文件, 行号) -> [秒, 本秒条数]
+        self.dropped = 0
+    
+    def filter(self, record):
+        if self.burst <= 0 or record.levelno >= logging.WARNING or hasattr(record, 'event'):
+            return True
+        
+        key = (record.pathname, record.lineno)
+        second = int(record.created)
+        window = self.windows.get(key)
+        if window is None or window[0] != second:
+            self.windows[key] = [second, 1]
+            return True
+        
+        window[1] += 1
+        if window[1] <= self.burst:
+            return True
+        self.dropped += 1
+        return False
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """把日志放入队列，队列满时丢弃并计数"""
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record):
+        # 同一进程内传递，消息留给后台线程格式化
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def setup_logging():
+    """配置日志：根 logger 只挂 QueueHandler，QueueListener 在后台线程输出到控制台（文本）和日志文件（JSON）"""
+    os.makedirs(os.path.dirname(LOG_FILE) or '.', exist_ok=True)
+    
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    file_handler = SizedTimedRotatingFileHandler(LOG_FILE, LOG_MAX_BYTES, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT)
+    file_handler.setFormatter(JsonFormatter())
+    
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    sampler = SamplingFilter(LOG_SAMPLE_BURST)
+    queue_handler.addFilter(sampler)
+    
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    
+    listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return queue_handler, sampler, listener
+
+log_handler, log_sampler, log_listener = setup_logging()
+logger = logging.getLogger('pansou_bot')
+
+logger.info("=== BOT 启动 ===")
+logger.info(f"🏗️  运行架构: {ARCH}，性能档位: {PERF_PROFILE}")
+
+# === 从环境变量读取白名单 ===
+def get_allowed_users():
+    """从环境变量获取允许的用户ID列表"""
+    allowed_users_str = os.getenv('ALLOWED_USERS', '')
+    logger.info(f"🔐 读取白名单环境变量: '{allowed_users_str}'")
+    
+    if not allowed_users_str or allowed_users_str.strip() == '':
+        logger.info("🔐 白名单为空，允许所有用户访问")
+        return []
+    
+    try:
+        allowed_users = []
+        for user_id_str in allowed_users_str.split(','):
+            user_id_str = user_id_str.strip()
+            if user_id_str:
+                allowed_users.append(int(user_id_str))
+        
+        logger.info(f"🔐 解析后的白名单用户: {allowed_users}")
+        return allowed_users
+    except Exception as e:
+        logger.error(f"❌ 解析白名单时出错: {e}")
+        return []
+
+ALLOWED_USER_IDS = get_allowed_users()
+
+def check_user_permission(user_id):
+    """检查用户权限"""
+    if not ALLOWED_USER_IDS:  # 如果列表为空，允许所有人
+        return True
+    return user_id in ALLOWED_USER_IDS
+
+logger.info(f"🔐 权限控制: {f'仅允许用户 {ALLOWED_USER_IDS}' if ALLOWED_USER_IDS else '允许所有用户'}")
+
+# 从环境变量加载配置
+BOT_TOKEN = os.getenv('BOT_TOKEN')
+SEARCH_API_URL = os.getenv('SEARCH_API_URL')
+PANSOU_USERNAME = os.getenv('PANSOU_USERNAME')
+PANSOU_PASSWORD = os.getenv('PANSOU_PASSWORD')
+
+# 检查必要配置
+if not BOT_TOKEN:
+    raise Exception("BOT_TOKEN 环境变量未设置")
+if not SEARCH_API_URL:
+    raise Exception("SEARCH_API_URL 环境变量未设置")
+if not PANSOU_USERNAME:
+    raise Exception("PANSOU_USERNAME 环境变量未设置")
+if not PANSOU_PASSWORD:
+    raise Exception("PANSOU_PASSWORD 环境变量未设置")
+
+logger.info(f"🔧 配置检查:")
+logger.info(f"  SEARCH_API_URL: {SEARCH_API_URL}")
+logger.info(f"  PANSOU_USERNAME: {PANSOU_USERNAME}")
+logger.info(f"  PANSOU_PASSWORD: ***{PANSOU_PASSWORD[-2:] if PANSOU_PASSWORD else 'None'}")
+
+# === 监控指标配置 ===
+# 设置后在该端口提供 Prometheus 格式的 /metrics，0 表示不启用
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_ADDR = os.getenv('METRICS_ADDR', '0.0.0.0')
+
+metrics_registry = CollectorRegistry()
+# 搜索各阶段耗时：token（获取Token）、backend（后端请求）、parse（解析响应）、telegram（发送/编辑消息）
+PHASE_SECONDS = Histogram(
+    'pansou_bot_phase_seconds', '各阶段耗时（秒）', ['phase'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+    registry=metrics_registry,
+)
+# 后端请求在并发控制队列中的等待时间，不需要排队的请求记为 0，排队超时的按实际等待时间记录
+BACKEND_QUEUE_WAIT = Histogram(
+    'pansou_bot_backend_queue_wait_seconds', '后端请求排队等待时间（秒）',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30),
+    registry=metrics_registry,
+)
+TOKEN_REFRESHES = Counter('pansou_bot_token_refreshes', 'Token 登录次数', ['result'], registry=metrics_registry)
+# handler 只取固定的几种，避免标签基数无限增长
+HANDLER_ERRORS = Counter('pansou_bot_handler_errors', '处理出错次数', ['handler'], registry=metrics_registry)
+CALLBACK_KINDS = ('type', 'page', 'stats', 'back', 'quick', 'copy')
+
+def record_handler_error(handler):
+    """记录处理出错；回调数据按前缀归类，未知前缀记为 other"""
+    if handler not in ('search', 'quick_search', 'inline'):
+        handler = handler.split('_', 1)[0]
+        if handler not in CALLBACK_KINDS:
+            handler = 'other'
+    HANDLER_ERRORS.labels(handler).inc()
+
+class BotStatsCollector:
+    """抓取时读取各组件已有的统计，热路径上不需要额外计数"""
+    
+    def collect(self):
+        cache_hits = CounterMetricFamily('pansou_bot_cache_hits', '缓存命中次数', labels=['cache'])
+        cache_misses = CounterMetricFamily('pansou_bot_cache_misses', '缓存未命中次数', labels=['cache'])
+        for name, stats in (('search', search_cache.stats()), ('page', page_cache.stats())):
+            cache_hits.add_metric([name], stats['hits'])
+            cache_misses.add_metric([name], stats['misses'])
+        yield cache_hits
+        yield cache_misses
+        
+        cache = search_cache.stats()
+        yield GaugeMetricFamily('pansou_bot_search_cache_bytes', '搜索缓存占用字节数', value=cache['bytes'])
+        yield CounterMetricFamily('pansou_bot_search_cache_evictions', '搜索缓存淘汰次数', value=cache['evictions'])
+        yield CounterMetricFamily('pansou_bot_coalesced_searches', '合并到进行中请求的搜索次数', value=search_stats['coalesced'])
+        yield CounterMetricFamily('pansou_bot_duplicate_resources', '去重时合并的重复资源条数', value=search_stats['duplicates'])
+        yield CounterMetricFamily('pansou_bot_warmed_searches', '缓存预热的搜索次数', value=warm_stats['warmed'])
+        warm_skipped = CounterMetricFamily('pansou_bot_warm_skipped', '缓存预热提前结束的次数', labels=['reason'])
+        warm_skipped.add_metric(['busy'], warm_stats['skipped_busy'])
+        warm_skipped.add_metric(['budget'], warm_stats['over_budget'])
+        yield warm_skipped
+        
+        sessions = session_store.stats()
+        yield GaugeMetricFamily('pansou_bot_sessions', '内存中的会话数', value=sessions['sessions'])
+        yield GaugeMetricFamily('pansou_bot_session_bytes', '会话占用字节数', value=sessions['bytes'])
+        evictions = CounterMetricFamily('pansou_bot_session_evictions', '会话淘汰次数', labels=['reason'])
+        evictions.add_metric(['memory'], sessions['evictions'])
+        evictions.add_metric(['expired'], sessions['expirations'])
+        yield evictions
+        
+        limits = rate_limiter.stats()
+        yield CounterMetricFamily('pansou_bot_rate_limited', '被限流的搜索次数', value=limits['limited'])
+        
+        backend = backend_admission.stats()
+        yield GaugeMetricFamily('pansou_bot_backend_active', '进行中的后端请求数', value=backend['active'])
+        yield GaugeMetricFamily('pansou_bot_backend_waiting', '排队中的后端请求数', value=backend['waiting'])
+        rejected = CounterMetricFamily('pansou_bot_backend_rejected', '被拒绝的后端请求数', labels=['reason'])
+        rejected.add_metric(['queue_full'], backend['shed'])
+        rejected.add_metric(['timeout'], backend['timeouts'])
+        yield rejected
+        
+        sends = outbound.stats()
+        yield GaugeMetricFamily('pansou_bot_outbound_queued', '排队中的 Telegram 请求数', value=sends['queued'])
+        yield CounterMetricFamily('pansou_bot_outbound_coalesced', '合并掉的消息编辑次数', value=sends['coalesced'])
+        yield CounterMetricFamily('pansou_bot_outbound_retries', 'Telegram 429 重试次数', value=sends['retries'])
+        yield CounterMetricFamily('pansou_bot_outbound_failed', 'Telegram 请求失败次数', value=sends['failed'])
+        
+        log_dropped = CounterMetricFamily('pansou_bot_log_dropped', '丢弃的日志条数', labels=['reason'])
+        log_dropped.add_metric(['sampled'], log_sampler.dropped)
+        log_dropped.add_metric(['queue_full'], log_handler.dropped)
+        yield log_dropped
+
+metrics_registry.register(BotStatsCollector())
+
+# === Pansou HTTP 客户端配置 ===
+# 连接池大小与 keep-alive 参数
+HTTP_POOL_SIZE = int(perf_setting('HTTP_POOL_SIZE'))
+HTTP_KEEPALIVE_CONNECTIONS = int(perf_setting('HTTP_KEEPALIVE_CONNECTIONS'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '60'))
+# 分阶段超时（秒）：连接超时 + 登录/搜索的读取超时
+HTTP_CONNECT_TIMEOUT = float(perf_setting('HTTP_CONNECT_TIMEOUT'))
+AUTH_READ_TIMEOUT = float(perf_setting('AUTH_READ_TIMEOUT'))
+SEARCH_READ_TIMEOUT = float(perf_setting('SEARCH_READ_TIMEOUT'))
+
+AUTH_TIMEOUT = httpx.Timeout(AUTH_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+SEARCH_TIMEOUT = httpx.Timeout(SEARCH_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+# 共享的异步 HTTP 客户端，在事件循环中首次使用时创建
+http_storage = {'client': None}
+
+def get_http_client():
+    """获取共享的 Pansou HTTP 客户端（复用 keep-alive 连接）"""
+    client = http_storage['client']
+    if client is None or client.is_closed:
+        limits = httpx.Limits(
+            max_connections=HTTP_POOL_SIZE,
+            max_keepalive_connections=HTTP_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        )
+        client = httpx.AsyncClient(limits=limits, timeout=AUTH_TIMEOUT)
+        http_storage['client'] = client
+        logger.info(f"🌐 创建HTTP连接池: 最大连接 {HTTP_POOL_SIZE}, keep-alive {HTTP_KEEPALIVE_CONNECTIONS}")
+    return client
+
+async def close_http_client(application=None):
+    """关闭共享的 HTTP 客户端"""
+    client = http_storage['client']
+    if client is not None:
+        await client.aclose()
+        http_storage['client'] = None
+
+# Token 到期前提前刷新的时间（秒）
+TOKEN_REFRESH_MARGIN = int(os.getenv('TOKEN_REFRESH_MARGIN', '300'))
+# 后台刷新的最短间隔（秒），防止有效期很短的 Token 被反复登录刷新
+TOKEN_REFRESH_MIN_DELAY = 10
+
+# 使用字典来存储 Token，避免全局变量问题
+# expires_at 为从 JWT 中解析出的过期时间戳，无法解析时为 None（只依赖 401 被动刷新）
+token_storage = {'token': None, 'expires_at': None, 'task': None}
+# 刷新锁：并发的搜索只会触发一次登录，其余请求等待并复用结果
+token_lock = asyncio.Lock()
+
+def get_login_url():
+    """获取登录接口URL"""
+    parsed_url = urlparse(SEARCH_API_URL)
+    login_url = urlunparse((parsed_url.scheme, parsed_url.netloc, '/api/auth/login', '', '', ''))
+    return login_url
+
+def decode_token_expiry(token):
+    """从JWT中解析过期时间（不校验签名，签名由后端校验）"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        exp = claims.get('exp')
+        return float(exp) if exp else None
+    except Exception as e:
+        logger.warning(f"⚠️ 无法解析Token过期时间: {e}")
+        return None
+
+async def background_token_refresh(token, delay):
+    """等待到刷新时间后在后台刷新Token"""
+    await asyncio.sleep(delay)
+    await refresh_token(token)
+
+def schedule_token_refresh(token, expires_at):
+    """在Token过期前于后台提前刷新"""
+    task = token_storage['task']
+    if task and task is not asyncio.current_task():
+        task.cancel()
+    token_storage['task'] = None
+    
+    if expires_at is None:
+        return
+    
+    # 有效期不超过提前量（或与后端时钟有偏差）时，改为在剩余有效期过半时刷新
+    remaining = expires_at - time.time()
+    delay = max(remaining - TOKEN_REFRESH_MARGIN, remaining / 2)
+    if delay < TOKEN_REFRESH_MIN_DELAY:
+        # 刷新后马上又要刷新，不再主动刷新，过期后由 401 触发
+        logger.warning(f"⚠️ Token剩余有效期只有 {int(remaining)} 秒，跳过后台刷新")
+        return
+    token_storage['task'] = asyncio.create_task(background_token_refresh(token, delay))
+    logger.info(f"⏰ 将在 {int(delay)} 秒后后台刷新Token")
+
+async def refresh_token(stale_token=None):
+    """刷新Token
+
+    stale_token 为调用方认为已失效的Token。持有锁后如果发现Token已被其他请求换掉，
+    直接返回新Token，保证同一时间只有一个登录请求。
+    """
+    logger.debug("🔄 refresh_token() 被调用")
+    async with token_lock:
+        current_token = token_storage['token']
+        if current_token and current_token != stale_token:
+            logger.info("🔑 Token已被其他请求刷新，直接复用")
+            return current_token
+        return await login()
+
+async def login():
+    """登录获取新Token（调用方需持有 token_lock）"""
+    try:
+        login_url = get_login_url()
+        
+        login_data = {
+            "username": PANSOU_USERNAME,
+            "password": PANSOU_PASSWORD
+        }
+        
+        logger.debug(f"🔄 尝试登录: {login_url}")
+        response = await get_http_client().post(login_url, json=login_data, timeout=AUTH_TIMEOUT)
+        logger.debug(f"🔄 登录响应状态码: {response.status_code}")
+        
+        if response.status_code == 200:
+            result = response.json()
+            new_token = result.get('token')
+            if new_token:
+                # 直接解析过期时间，不再额外调用 /api/auth/verify
+                expires_at = decode_token_expiry(new_token)
+                token_storage['token'] = new_token
+                token_storage['expires_at'] = expires_at
+                schedule_token_refresh(new_token, expires_at)
+                TOKEN_REFRESHES.labels('success').inc()
+                logger.info(f"✅ Token获取成功: {new_token[:20]}...")
+                return new_token
+            else:
+                logger.error("❌ 响应中没有token字段")
+        else:
+            logger.error(f"❌ 登录失败: {response.status_code} - {response.text}")
+            
+    except Exception as e:
+        logger.error(f"💥 异常: {type(e).__name__}: {e}")
+    
+    TOKEN_REFRESHES.labels('failure').inc()
+    return None
+
+async def get_valid_token():
+    """获取有效的Token（只检查本地缓存的过期时间，不请求后端）"""
+    current_token = token_storage['token']
+    
+    # 如果没有Token，直接获取新的
+    if not current_token:
+        logger.info("🔑 无Token，获取新Token...")
+        return await refresh_token()
+    
+    expires_at = token_storage['expires_at']
+    if expires_at is not None and expires_at <= time.time():
+        logger.info("🔑 Token已过期，刷新Token...")
+        return await refresh_token(current_token)
+    
+    return current_token
+
+async def search_api(keyword: str, cloud_types=None, src=None):
+    """异步的API搜索函数，直接运行在机器人的事件循环上
+
+    cloud_types 为网盘类型列表时由后端只搜索并返回这些类型；
+    src 为 'tg' 或 'plugin' 时只搜索对应的数据来源。
+    """
+    logger.debug(f"🔍 search_api() 被调用，关键词: {keyword}, 类型: {cloud_types or '全部'}")
+    
+    # 获取有效的Token
+    with PHASE_SECONDS.labels('token').time():
+        valid_token = await get_valid_token()
+    if not valid_token:
+        logger.error("❌ 无法获取有效Token")
+        return None
+    
+    headers = {
+        "Authorization": f"Bearer {valid_token}",
+        "Content-Type": "application/json",
+    }
+    
+    # 机器人只使用 merged_by_type，让后端只返回合并后的结果
+    data = {"kw": keyword, "res": "merge"}
+    if cloud_types:
+        data["cloud_types"] = cloud_types
+    if src:
+        data["src"] = src
+    
+    logger.debug(f"🔍 发送搜索请求到: {SEARCH_API_URL}")
+    try:
+        client = get_http_client()
+        with PHASE_SECONDS.labels('backend').time():
+            response = await client.post(SEARCH_API_URL, headers=headers, json=data, timeout=SEARCH_TIMEOUT)
+        logger.debug(f"🔍 搜索响应状态码: {response.status_code}")
+        
+        # Token 被后端拒绝时才重新登录，并重试一次
+        if response.status_code == 401:
+            logger.warning("🔑 Token被拒绝(401)，重新登录...")
+            valid_token = await refresh_token(valid_token)
+            if not valid_token:
+                logger.error("❌ 无法获取有效Token")
+                return None
+            headers["Authorization"] = f"Bearer {valid_token}"
+            with PHASE_SECONDS.labels('backend').time():
+                response = await client.post(SEARCH_API_URL, headers=headers, json=data, timeout=SEARCH_TIMEOUT)
+            logger.debug(f"🔍 重试搜索响应状态码: {response.status_code}")
+        
+        # 响应体由调用方解析，这里不再重复解析 JSON
+        if response.status_code != 200:
+            logger.error(f"❌ 搜索请求失败: {response.status_code}")
+        
+        return response
+        
+    except Exception as e:
+        logger.error(f"💥 请求异常: {type(e).__name__}: {e}")
+        return None
+
+# === 搜索结果的紧凑表示 ===
+class Resource:
+    """单条资源：只保留展示需要的字段，用 __slots__ 代替接口返回的字典"""
+    
+    __slots__ = ('note', 'url', 'password', 'source', 'datetime')
+    
+    def __init__(self, note, url, password, source, datetime):
+        self.note = note
+        self.url = url
+        self.password = password
+        self.source = source
+        self.datetime = datetime
+    
+    @classmethod
+    def from_api(cls, item):
+        """从接口返回的资源字典构造，来源字符串驻留以便大量资源共享同一对象"""
+        return cls(
+            item.get('note') or item.get('title') or '无标题',
+            item.get('url') or '',
+            item.get('password') or '',
+            sys.intern(item.get('source') or '未知来源'),
+            item.get('datetime') or '',
+        )
+    
+    @classmethod
+    def from_row(cls, row):
+        """从持久化的行（列表）恢复"""
+        note, url, password, source, datetime = row
+        return cls(note, url, password, sys.intern(source), datetime)
+    
+    def to_row(self):
+        """转换为列表，用于持久化"""
+        return [self.note, self.url, self.password, self.source, self.datetime]
+
+def compact_search_data(data, keyword='', count_sources=False):
+    """把接口返回的 data 转换为紧凑表示：每种资源类型对应一个 Resource 列表
+
+    每个结果集分配一个唯一 ID，用于缓存该结果集渲染好的页面。
+    开启 RESULT_RANKING 时同时去重并排序，total 为去重后的条数；
+    count_sources 为真时（结果集第一次从后端获取）把来源计入可靠度统计。
+    """
+    merged_by_type = {
+        sys.intern(resource_type): [Resource.from_api(item) for item in items]
+        for resource_type, items in (data.get('merged_by_type') or {}).items()
+    }
+    total = data.get('total', 0)
+    if RESULT_RANKING:
+        merged_by_type = rank_search_results(merged_by_type, keyword, count_sources)
+        total = sum(len(resources) for resources in merged_by_type.values())
+    return {'id': uuid.uuid4().hex[:12], 'total': total, 'merged_by_type': merged_by_type}
+
+# === 结果去重与排序配置 ===
+# 开启时同一链接（磁力链接按 btih）只保留一条，并按标题匹配度、发布时间和来源可靠度排序
+RESULT_RANKING = os.getenv('RESULT_RANKING', 'true').lower() in ('1', 'true', 'yes')
+# 各项得分的权重，得分都在 0~1 之间
+RANK_MATCH_WEIGHT = 3.0
+RANK_RECENCY_WEIGHT = 2.0
+RANK_SOURCE_WEIGHT = 1.0
+RANK_CORROBORATION_WEIGHT = 1.0
+# 发布时间得分的半衰期（天）
+RANK_RECENCY_HALF_LIFE = 30
+# 记录可靠度的来源数上限
+SOURCE_STATS_MAX_SOURCES = 1000
+
+MAGNET_BTIH = re.compile(r'xt=urn:btih:([0-9a-zA-Z]+)')
+# 不影响链接指向的查询参数：提取码、分享来源和统计参数
+URL_NOISE_PARAMS = frozenset(('pwd', 'password', 'passcode', 'from', 'entry', 'share_source', 'source'))
+
+def canonical_url(url: str):
+    """链接的规范形式，用作去重键：磁力链接取小写十六进制 btih，其它链接忽略协议、www、末尾斜杠、锚点和无关参数"""
+    if url.startswith('magnet:'):
+        match = MAGNET_BTIH.search(url)
+        if match is None:
+            return url
+        btih = match.group(1)
+        if len(btih) == 32:
+            # base32 形式的 btih 转换为十六进制
+            try:
+                btih = base64.b32decode(btih.upper()).hex()
+            except ValueError:
+                pass
+        return 'btih:' + btih.lower()
+    
+    # 直接按分隔符切分，比 urlparse 快得多，去重时每条资源都要调用
+    _, sep, rest = url.strip().partition('://')
+    if not sep:
+        return url.strip()
+    rest, _, query = rest.split('#', 1)[0].partition('?')
+    host, _, path = rest.partition('/')
+    key = f"{host.lower().removeprefix('www.')}/{path.rstrip('/')}"
+    if query:
+        params = sorted(
+            param for param in query.split('&')
+            if param and not param.startswith('utm_') and param.split('=', 1)[0].lower() not in URL_NOISE_PARAMS
+        )
+        if params:
+            key += '?' + '&'.join(params)
+    return key
+
+class SourceStats:
+    """来源可靠度：来源报告的链接同时被其他来源报告的比例，按所有结果集累计
+
+    可靠度 = (被印证次数 + 1) / (报告次数 + 2)，没有记录的来源为 0.5。
+    磁盘缓存在线程池中解析，因此用锁保护。
+    """
+    
+    def __init__(self, max_sources):
+        self.max_sources = max_sources
+        # 来源 -> [报告次数, 被印证次数]，按最近出现顺序排列
+        self.counts = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def update(self, groups):
+        """groups 为每个去重后链接的来源集合"""
+        with self.lock:
+            for sources in groups:
+                corroborated = len(sources) > 1
+                for source in sources:
+                    counts = self.counts.get(source)
+                    if counts is None:
+                        counts = self.counts[source] = [0, 0]
+                    else:
+                        self.counts.move_to_end(source)
+                    counts[0] += 1
+                    counts[1] += corroborated
+            while len(self.counts) > self.max_sources:
+                self.counts.popitem(last=False)
+    
+    def reliability(self):
+        """返回 来源 -> 可靠度 的快照，排序时直接查表"""
+        with self.lock:
+            return {source: (corroborated + 1) / (reported + 2) for source, (reported, corroborated) in self.counts.items()}
+
+source_stats = SourceStats(SOURCE_STATS_MAX_SOURCES)
+
+def recency_score(value: str, today: int):
+    """发布时间得分：按半衰期衰减，无法解析时为 0"""
+    try:
+        age = today - date.fromisoformat(value[:10]).toordinal()
+    except ValueError:
+        return 0.0
+    return 0.5 ** (max(age, 0) / RANK_RECENCY_HALF_LIFE)
+
+def match_score(note: str, keyword: str, tokens):
+    """标题匹配度：完整包含关键词为 1，否则按包含的词所占比例计分"""
+    note = note.casefold()
+    if keyword and keyword in note:
+        return 1.0
+    if not tokens:
+        return 0.0
+    return 0.8 * sum(token in note for token in tokens) / len(tokens)
+
+def dedupe_resources(resources):
+    """按规范链接合并重复资源，返回 [(资源, 来源集合)]，保留最早出现的顺序
+
+    重复的资源保留发布时间最新的一条，缺少提取码时用其它条目的补上。
+    """
+    groups = {}
+    for resource in resources:
+        if not resource.url:
+            groups[id(resource)] = [resource, {resource.source}]
+            continue
+        key = canonical_url(resource.url)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = [resource, {resource.source}]
+            continue
+        best = group[0]
+        group[1].add(resource.source)
+        if resource.datetime > best.datetime:
+            resource.password = resource.password or best.password
+            group[0] = resource
+        elif not best.password:
+            best.password = resource.password
+    return list(groups.values())
+
+def rank_search_results(merged_by_type: dict, keyword: str, count_sources=False):
+    """对整个结果集去重并排序，每个结果集只在解析时计算一次
+
+    得分所需的关键词、日期和来源可靠度先算好，每条资源只做查表和一次求和，再按预先算好的键排序。
+    同一结果集会被多次解析（渐进式轮询、缓存预热、磁盘缓存），只有 count_sources 为真时才更新来源统计。
+    """
+    grouped = {resource_type: dedupe_resources(resources) for resource_type, resources in merged_by_type.items()}
+    if count_sources:
+        source_stats.update(sources for groups in grouped.values() for _, sources in groups)
+    
+    reliability = source_stats.reliability()
+    keyword = normalize_keyword(keyword)
+    tokens = keyword.split()
+    today = date.today().toordinal()
+    recency_cache = {}
+    
+    ranked = {}
+    removed = 0
+    for resource_type, groups in grouped.items():
+        removed += len(merged_by_type[resource_type]) - len(groups)
+        scored = []
+        for resource, sources in groups:
+            day = resource.datetime[:10]
+            recency = recency_cache.get(day)
+            if recency is None:
+                recency = recency_cache[day] = recency_score(day, today)
+            score = (RANK_MATCH_WEIGHT * match_score(resource.note, keyword, tokens)
+                     + RANK_RECENCY_WEIGHT * recency
+                     + RANK_SOURCE_WEIGHT * max(reliability.get(source, 0.5) for source in sources)
+                     + RANK_CORROBORATION_WEIGHT * min(len(sources) - 1, 3) / 3)
+            scored.append((score, resource))
+        # 排序是稳定的，得分相同时保持接口返回的顺序
+        scored.sort(key=itemgetter(0), reverse=True)
+        ranked[resource_type] = [resource for _, resource in scored]
+    
+    if removed:
+        search_stats['duplicates'] += removed
+        logger.debug(f"🧹 去除重复资源 {removed} 条: {keyword}")
+    return ranked
+
+# === 搜索结果缓存配置 ===
+# TTL 为 0 时关闭缓存
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '600'))
+SEARCH_CACHE_MAX_ENTRIES = int(perf_setting('SEARCH_CACHE_MAX_ENTRIES'))
+SEARCH_CACHE_MAX_BYTES = int(perf_setting('SEARCH_CACHE_MAX_BYTES'))
+
+class SearchError(Exception):
+    """搜索失败，异常信息直接展示给用户"""
+
+class SearchCache:
+    """搜索结果缓存：按规范化关键词存储，TTL 过期 + LRU 淘汰，同时限制条目数和字节数"""
+    
+    def __init__(self, ttl, max_entries, max_bytes, on_remove=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # 条目被移除（过期、淘汰或替换）时的回调，参数为缓存的数据
+        self.on_remove = on_remove
+        # key -> (过期时间, 字节数, 数据)，按最近使用顺序排列
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """读取缓存，未命中或已过期返回 None"""
+        return self.get_first((key,))[1]
+    
+    def get_first(self, keys):
+        """按顺序读取第一个未过期的缓存，返回 (键, 数据)，都未命中时返回 (None, None)
+
+        整次查找只计一次命中或未命中。
+        """
+        now = time.monotonic()
+        for key in keys:
+            entry = self.entries.get(key)
+            if entry is None:
+                continue
+            if entry[0] <= now:
+                self._remove(key)
+                continue
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return key, entry[2]
+        
+        self.misses += 1
+        return None, None
+    
+    def expires_in(self, key):
+        """缓存条目剩余的有效秒数，没有缓存时为 0"""
+        entry = self.entries.get(key)
+        return max(entry[0] - time.monotonic(), 0) if entry is not None else 0
+    
+    def __contains__(self, key):
+        """是否有未过期的缓存（不计入命中统计）"""
+        entry = self.entries.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+    
+    def set(self, key, data, size, ttl=None):
+        """写入缓存，超出限制时淘汰最久未使用的条目；ttl 默认使用缓存配置"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        
+        if key in self.entries:
+            self._remove(key)
+        
+        self.entries[key] = (time.monotonic() + ttl, size, data)
+        self.total_bytes += size
+        
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            oldest_key = next(iter(self.entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+    
+    def _remove(self, key):
+        _, size, data = self.entries.pop(key)
+        self.total_bytes -= size
+        if self.on_remove is not None:
+            self.on_remove(data)
+    
+    def stats(self):
+        """缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+# 渲染好的资源页缓存上限（条）
+PAGE_CACHE_MAX_ENTRIES = int(perf_setting('PAGE_CACHE_MAX_ENTRIES'))
+
+class PageCache:
+    """已渲染资源页的缓存：按 (结果集ID, 资源类型, 页码) 存储，结果集失效时一并清除"""
+    
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        # (result_id, resource_type, page) -> 渲染结果，按最近使用顺序排列
+        self.pages = OrderedDict()
+        # result_id -> 该结果集已缓存的页
+        self.keys_by_result = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, result_id, resource_type, page):
+        key = (result_id, resource_type, page)
+        rendered = self.pages.get(key)
+        if rendered is None:
+            self.misses += 1
+            return None
+        self.pages.move_to_end(key)
+        self.hits += 1
+        return rendered
+    
+    def set(self, result_id, resource_type, page, rendered):
+        if self.max_entries <= 0:
+            return
+        key = (result_id, resource_type, page)
+        self.pages[key] = rendered
+        self.pages.move_to_end(key)
+        self.keys_by_result.setdefault(result_id, set()).add(key)
+        
+        while len(self.pages) > self.max_entries:
+            oldest_key, _ = self.pages.popitem(last=False)
+            self._forget(oldest_key)
+    
+    def invalidate(self, result_id):
+        """清除某个结果集的全部已渲染页"""
+        for key in self.keys_by_result.pop(result_id, ()):
+            self.pages.pop(key, None)
+    
+    def _forget(self, key):
+        keys = self.keys_by_result.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_result[key[0]]
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.pages),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+page_cache = PageCache(PAGE_CACHE_MAX_ENTRIES)
+
+# 结果集被淘汰或替换时，清除其已渲染的页面
+search_cache = SearchCache(SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_MAX_BYTES,
+                           on_remove=lambda data: page_cache.invalidate(data['id']))
+
+# === 关键词规范化配置 ===
+# 缓存查找和请求后端前先把关键词转换为规范形式，写法不同的同一关键词共享缓存和进行中的请求
+# 开启繁体转简体，依赖 requirements.txt 中的 opencc-python-reimplemented
+KEYWORD_T2S = os.getenv('KEYWORD_T2S', 'false').lower() in ('1', 'true', 'yes')
+# 折叠为空格时保留的标点，它们常是片名的一部分（如 C#、9.5、Spider-Man）
+KEYWORD_KEEP_PUNCTUATION = frozenset(".#&'-_")
+# 缓存的规范化结果条数
+KEYWORD_CACHE_SIZE = 4096
+
+if KEYWORD_T2S:
+    try:
+        import opencc
+    except ImportError:
+        raise Exception("KEYWORD_T2S 需要安装 opencc：pip install opencc-python-reimplemented")
+    t2s_converter = opencc.OpenCC('t2s')
+else:
+    t2s_converter = None
+
+@functools.lru_cache(maxsize=KEYWORD_CACHE_SIZE)
+def normalize_keyword(keyword: str):
+    """规范化关键词，用作缓存键和后端搜索词
+
+    全角转半角（NFKC），标点折叠为空格，可选繁体转简体，合并空白并忽略大小写。
+    """
+    keyword = unicodedata.normalize('NFKC', keyword)
+    keyword = ''.join(
+        ' ' if char not in KEYWORD_KEEP_PUNCTUATION and unicodedata.category(char).startswith('P') else char
+        for char in keyword
+    )
+    if t2s_converter is not None:
+        keyword = t2s_converter.convert(keyword)
+    return ' '.join(keyword.split()).casefold()
+
+# === 后端并发控制 ===
+# 同时进行的后端搜索请求上限；超出的请求排队，队列满或等待超时时直接提示用户稍后再试
+BACKEND_MAX_CONCURRENCY = int(os.getenv('BACKEND_MAX_CONCURRENCY', '10'))
+BACKEND_MAX_QUEUE = int(os.getenv('BACKEND_MAX_QUEUE', '50'))
+BACKEND_MAX_QUEUE_WAIT = float(os.getenv('BACKEND_MAX_QUEUE_WAIT', '15'))
+
+class OverloadedError(SearchError):
+    """后端繁忙，请求被拒绝"""
+
+class AdmissionControl:
+    """限制同时进行的后端请求数，排队长度和排队时间都有上限"""
+    
+    def __init__(self, limit, max_queue, max_wait):
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+    
+    async def acquire(self):
+        """获取一个后端请求名额，失败时抛出 OverloadedError"""
+        if self.active < self.limit and not self.semaphore.locked():
+            await self.semaphore.acquire()
+            BACKEND_QUEUE_WAIT.observe(0)
+        else:
+            if self.waiting >= self.max_queue:
+                self.shed += 1
+                raise OverloadedError("🚦 当前搜索人数较多，请稍后再试")
+            
+            start = time.monotonic()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                BACKEND_QUEUE_WAIT.observe(time.monotonic() - start)
+                raise OverloadedError("🚦 当前搜索人数较多，请稍后再试")
+            finally:
+                self.waiting -= 1
+            
+            wait = time.monotonic() - start
+            BACKEND_QUEUE_WAIT.observe(wait)
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        
+        self.admitted += 1
+        self.active += 1
+    
+    def release(self):
+        self.active -= 1
+        self.semaphore.release()
+    
+    def stats(self):
+        return {
+            'active': self.active,
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'shed': self.shed,
+            'timeouts': self.timeouts,
+            'avg_wait': self.wait_total / self.admitted if self.admitted else 0.0,
+            'max_wait': self.wait_max,
+        }
+
+backend_admission = AdmissionControl(BACKEND_MAX_CONCURRENCY, BACKEND_MAX_QUEUE, BACKEND_MAX_QUEUE_WAIT)
+
+# 进行中的搜索：规范化关键词 -> asyncio.Task，相同关键词的并发搜索共享同一个后端请求
+inflight_searches = {}
+search_stats = {'coalesced': 0, 'duplicates': 0}
+
+def search_cache_key(keyword: str, resource_type=None):
+    """缓存键：规范化关键词，按类型搜索时附加类型"""
+    cache_key = normalize_keyword(keyword)
+    return f"{cache_key}|{resource_type}" if resource_type else cache_key
+
+async def get_search_data(keyword: str, resource_type=None):
+    """获取紧凑格式的搜索结果，优先读取缓存；失败时抛出 SearchError
+
+    resource_type 不为空时只搜索该网盘类型（快速搜索）。
+    """
+    cache_key = search_cache_key(keyword, resource_type)
+    # 快速搜索时，已缓存全部类型的结果也可以直接从中取出该类型，不再请求后端
+    keys = (cache_key, search_cache_key(keyword)) if resource_type else (cache_key,)
+    hit_key, data = search_cache.get_first(keys)
+    if hit_key == cache_key:
+        logger.debug(f"⚡ 命中搜索缓存: {cache_key}")
+        return data
+    if data is not None:
+        logger.debug(f"⚡ 从全类型缓存中取出 {resource_type}: {cache_key}")
+        resources = data['merged_by_type'].get(resource_type, [])
+        return {'id': data['id'], 'total': len(resources), 'merged_by_type': {resource_type: resources}}
+    
+    # shield：单个等待者被取消时不会取消共享的后端请求
+    return await asyncio.shield(start_search(keyword, cache_key, resource_type))
+
+def start_search(keyword: str, cache_key: str, resource_type=None):
+    """返回该缓存键进行中的搜索任务，没有时发起新的搜索"""
+    task = inflight_searches.get(cache_key)
+    if task is None:
+        task = asyncio.create_task(fetch_search_data(keyword, cache_key, resource_type))
+        inflight_searches[cache_key] = task
+        task.add_done_callback(lambda done: finish_inflight_search(cache_key, done))
+    else:
+        search_stats['coalesced'] += 1
+        logger.debug(f"🔗 合并相同关键词的搜索请求: {cache_key}")
+    return task
+
+def finish_inflight_search(cache_key, task):
+    """共享搜索结束后移除登记"""
+    if inflight_searches.get(cache_key) is task:
+        del inflight_searches[cache_key]
+    # 所有等待者都已取消时，避免出现 "exception was never retrieved" 警告
+    if not task.cancelled():
+        task.exception()
+
+async def fetch_search_data(keyword: str, cache_key: str, resource_type=None, refresh=False):
+    """先查磁盘缓存，再请求后端，并写入缓存；refresh 为真时（缓存预热）不读磁盘缓存"""
+    if session_db is not None and not refresh:
+        stored = await run_db(session_db.load_result, cache_key, keyword)
+        if stored is not None:
+            data, size, expires_at = stored
+            search_cache.set(cache_key, data, size, ttl=expires_at - time.time())
+            logger.debug(f"💾 命中磁盘缓存: {cache_key}")
+            return data
+    
+    data, response = await request_search_data(keyword, resource_type, count_sources=not refresh)
+    store_search_data(cache_key, data, response)
+    return data
+
+async def request_search_data(keyword: str, resource_type=None, src=None, count_sources=False):
+    """请求后端并转换为紧凑格式，返回 (data, 响应)；失败或后端繁忙时抛出 SearchError
+
+    count_sources 只在缓存未命中、第一次获取结果集时为真，重复获取不计入来源可靠度统计。
+    """
+    await backend_admission.acquire()
+    try:
+        # 后端收到规范化后的关键词，与缓存键一致
+        response = await search_api(normalize_keyword(keyword), [resource_type] if resource_type else None, src)
+    finally:
+        backend_admission.release()
+    
+    if response is None:
+        raise SearchError("❌ 搜索失败：无法获取Token")
+    
+    if response.status_code != 200:
+        raise SearchError(f"❌ 搜索失败，状态码: {response.status_code}")
+    
+    with PHASE_SECONDS.labels('parse').time():
+        result = response.json()
+        if result.get('code') != 0:
+            logger.error(f"❌ 搜索API返回错误: {result.get('message')}")
+            raise SearchError(f"❌ API返回错误: {result.get('message', '未知错误')}")
+        data = compact_search_data(result.get('data') or {}, keyword, count_sources)
+    
+    logger.info("✅ 搜索API调用成功")
+    return data, response
+
+def store_search_data(cache_key: str, data: dict, response):
+    """把搜索结果写入内存缓存，并在后台写入磁盘"""
+    # 按内存中紧凑结构的大小计费，它通常是响应体的两倍左右
+    search_cache.set(cache_key, data, estimate_size(data))
+    if session_db is not None and SEARCH_CACHE_TTL > 0:
+        run_in_background(run_db(session_db.save_result, cache_key, response.content, time.time() + SEARCH_CACHE_TTL))
+
+# 资源类型显示名称映射
+RESOURCE_TYPE_NAMES = {
+    'pikpak': 'Pikpak',
+    'xunlei': '迅雷云盘', 
+    'baidu': '百度云盘',
+    'magnet': '磁力链接',
+    'other': '其它',
+    'others': '其它',
+    'tianyi': '天翼云盘',
+    '115': '115网盘',
+    'quark': '夸克网盘',
+    'aliyun': '阿里云盘'
+}
+
+# 快速搜索菜单配置
+QUICK_SEARCH_MENU = {
+    "115网盘": "115",
+    "阿里云盘": "aliyun", 
+    "百度云盘": "baidu",
+    "迅雷云盘": "xunlei",
+    "夸克网盘": "quark",
+    "Pikpak": "pikpak",
+    "天翼云盘": "tianyi",
+    "磁力链接": "magnet"
+}
+
+# === 按钮回调编码 ===
+# callback_data = 动作前缀（1 个字符）+ 句柄。句柄把 (会话所属用户, 结果集校验值, 网盘类型, 页码, 页内序号)
+# 打包为 14 字节后做 base64 编码（20 个字符），远低于 Telegram 64 字节的限制。
+# 所有字段都在按钮里，不依赖内存中的状态，重启后从磁盘恢复的会话仍可继续翻页和复制。
+CALLBACK_HANDLE = struct.Struct('>qHBHB')
+# 网盘类型编号表（编号从 1 开始）：只能在末尾追加，已发出的按钮依赖这些编号；
+# 不在表中的类型编号为 0，类型名直接追加在句柄后面
+CALLBACK_TYPES = ('magnet', 'ed2k', 'baidu', 'aliyun', 'quark', 'tianyi', 'uc', 'mobile', '115', 'pikpak', 'xunlei', '123', 'others', 'other')
+CALLBACK_TYPE_CODES = {resource_type: code for code, resource_type in enumerate(CALLBACK_TYPES, start=1)}
+
+class CallbackHandle:
+    """解码后的按钮句柄"""
+    
+    __slots__ = ('user_id', 'result_tag', 'resource_type', 'page', 'item')
+    
+    def __init__(self, user_id, result_tag, resource_type, page, item):
+        self.user_id = user_id
+        self.result_tag = result_tag
+        self.resource_type = resource_type
+        self.page = page
+        self.item = item
+
+def result_tag(session):
+    """结果集校验值：用户重新搜索后，旧消息上的按钮不会读到新的结果
+
+    包含结果集 ID，缓存过期后重新搜索同一关键词得到的结果顺序可能不同，旧按钮同样失效。
+    """
+    if not session:
+        return 0
+    return zlib.crc32(f"{session['keyword']}\0{session.get('result_id') or ''}".encode()) & 0xFFFF
+
+def encode_callback(action, user_id=0, session=None, resource_type='', page=0, item=0):
+    """生成按钮的 callback_data"""
+    code = CALLBACK_TYPE_CODES.get(resource_type, 0)
+    payload = CALLBACK_HANDLE.pack(user_id, result_tag(session), code, page, item)
+    if resource_type and not code:
+        payload += resource_type.encode()
+    return action + binascii.b2a_base64(payload, newline=False).decode()
+
+def decode_callback(data):
+    """解析 callback_data，返回 (动作前缀, CallbackHandle)；格式不正确时句柄为 None"""
+    action = data[:1]
+    try:
+        payload = binascii.a2b_base64(data[1:])
+        user_id, tag, code, page, item = CALLBACK_HANDLE.unpack_from(payload)
+        resource_type = CALLBACK_TYPES[code - 1] if code else payload[CALLBACK_HANDLE.size:].decode()
+    except (ValueError, IndexError, struct.error):
+        return action, None
+    return action, CallbackHandle(user_id, tag, resource_type, page, item)
+
+def get_resource_display_name(resource_type):
+    """获取资源类型的显示名称"""
+    return RESOURCE_TYPE_NAMES.get(resource_type.lower(), resource_type.upper())
+
+# === 用户会话配置 ===
+# 会话在最后一次访问后保留的时间（秒）以及全部会话的内存预算（字节）
+SESSION_TTL = int(os.getenv('SESSION_TTL', '3600'))
+SESSION_MAX_BYTES = int(perf_setting('SESSION_MAX_BYTES'))
+
+def estimate_size(obj):
+    """粗略估算对象（dict/list/str/Resource 组成的数据）占用的内存字节数"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += sys.getsizeof(key) + estimate_size(value)
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            size += estimate_size(item)
+    elif isinstance(obj, Resource):
+        for name in Resource.__slots__:
+            size += sys.getsizeof(getattr(obj, name))
+    return size
+
+class SessionStore:
+    """用户会话存储：每次访问刷新 TTL，总内存超出预算时按 LRU 淘汰
+    
+    同一结果集的资源列表由搜索缓存和所有查看它的会话共享，按 (结果集ID, 资源类型) 只计一次内存。
+    """
+    
+    def __init__(self, ttl, max_bytes):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # user_id -> (过期时间, 字节数, 会话)，按最近访问顺序排列，字节数不含共享的资源列表
+        # TTL 固定且访问即续期，因此排在最前面的总是最先过期的会话
+        self.sessions = OrderedDict()
+        # (result_id, resource_type) -> [字节数, 引用该列表的会话数]
+        self.shared = {}
+        self.total_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, user_id):
+        """读取会话，不存在或已过期返回 None"""
+        entry = self.sessions.get(user_id)
+        if entry is None:
+            return None
+        
+        expires_at, size, session = entry
+        if expires_at <= time.monotonic():
+            self._remove(user_id)
+            self.expirations += 1
+            return None
+        
+        self.sessions[user_id] = (time.monotonic() + self.ttl, size, session)
+        self.sessions.move_to_end(user_id)
+        return session
+    
+    def set(self, user_id, session):
+        """保存会话，超出内存预算时淘汰最久未访问的会话"""
+        if user_id in self.sessions:
+            self._remove(user_id)
+        
+        self._purge_expired()
+        
+        size = self._charge(session)
+        self.sessions[user_id] = (time.monotonic() + self.ttl, size, session)
+        self.total_bytes += size
+        
+        while self.total_bytes > self.max_bytes and len(self.sessions) > 1:
+            oldest_user = next(iter(self.sessions))
+            self._remove(oldest_user)
+            self.evictions += 1
+            logger.info(f"🧹 会话内存超出预算，淘汰用户 {oldest_user} 的会话")
+    
+    def _purge_expired(self):
+        now = time.monotonic()
+        while self.sessions:
+            user_id, (expires_at, _, _) = next(iter(self.sessions.items()))
+            if expires_at > now:
+                break
+            self._remove(user_id)
+            self.expirations += 1
+    
+    def _shared_keys(self, session):
+        """会话中与其他会话共享的资源列表"""
+        result_id = session.get('result_id')
+        merged_by_type = session.get('merged_by_type')
+        if not result_id or not merged_by_type:
+            return ()
+        return [(result_id, resource_type) for resource_type in merged_by_type]
+    
+    def _charge(self, session):
+        """计入会话占用的内存，返回会话自身的字节数（共享的资源列表另外计数）"""
+        merged_by_type = session.get('merged_by_type')
+        keys = self._shared_keys(session)
+        if not keys:
+            return estimate_size(session)
+        
+        size = estimate_size({key: value for key, value in session.items() if key != 'merged_by_type'})
+        size += sys.getsizeof(merged_by_type)
+        for key in keys:
+            entry = self.shared.get(key)
+            if entry is None:
+                resources = merged_by_type[key[1]]
+                entry = self.shared[key] = [estimate_size(resources), 0]
+                self.total_bytes += entry[0]
+            entry[1] += 1
+        return size
+    
+    def _remove(self, user_id):
+        _, size, session = self.sessions.pop(user_id)
+        self.total_bytes -= size
+        for key in self._shared_keys(session):
+            entry = self.shared[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.shared[key]
+                self.total_bytes -= entry[0]
+    
+    def stats(self):
+        """会话统计信息"""
+        return {
+            'sessions': len(self.sessions),
+            'bytes': self.total_bytes,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+session_store = SessionStore(SESSION_TTL, SESSION_MAX_BYTES)
+
+# === 持久化存储配置 ===
+# SQLite 数据库路径（位于 docker-compose 挂载的 ./data 目录），留空则只使用内存
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'data/bot.db')
+# 会话在磁盘上保留的时间（秒）
+SESSION_DB_TTL = int(os.getenv('SESSION_DB_TTL', str(7 * 24 * 3600)))
+# 清理过期会话和搜索结果的间隔（秒），在写入时顺带执行
+SESSION_DB_PURGE_INTERVAL = int(os.getenv('SESSION_DB_PURGE_INTERVAL', '3600'))
+# 执行数据库操作的线程数（SessionDB 内部串行访问连接，多于 2 个线程没有收益）
+DB_WORKERS = int(perf_setting('DB_WORKERS'))
+
+# 每页显示的资源数量
+ITEMS_PER_PAGE = 5
+
+class SessionDB:
+    """基于 SQLite（WAL 模式）的会话与搜索结果存储
+
+    会话的资源按页保存，重启后只读取用户请求的那一页。
+    所有方法都是同步的，由事件循环通过 run_db 放到 db_executor 线程池中执行。
+    """
+    
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            user_id INTEGER PRIMARY KEY,
+            keyword TEXT NOT NULL,
+            result_id TEXT,
+            total INTEGER NOT NULL,
+            type_counts TEXT NOT NULL,
+            view_type TEXT,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS session_pages (
+            user_id INTEGER NOT NULL,
+            resource_type TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            items TEXT NOT NULL,
+            PRIMARY KEY (user_id, resource_type, page)
+        );
+        CREATE TABLE IF NOT EXISTS search_results (
+            cache_key TEXT PRIMARY KEY,
+            body BLOB NOT NULL,
+            expires_at REAL NOT NULL
+        );
+    '''
+    
+    def __init__(self, path, ttl, purge_interval):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.next_purge = 0.0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.executescript(self.SCHEMA)
+            # 旧版本创建的数据库没有 result_id 列
+            columns = {row[1] for row in self.conn.execute('PRAGMA table_info(sessions)')}
+            if 'result_id' not in columns:
+                self.conn.execute('ALTER TABLE sessions ADD COLUMN result_id TEXT')
+        self.maybe_purge()
+    
+    def save_session(self, user_id, session, saved_at):
+        """保存会话及其全部分页；只保留同一用户最新的一次搜索"""
+        pages = []
+        for resource_type, resources in (session['merged_by_type'] or {}).items():
+            for page, start in enumerate(range(0, len(resources), ITEMS_PER_PAGE)):
+                items = json.dumps([resource.to_row() for resource in resources[start:start + ITEMS_PER_PAGE]], ensure_ascii=False)
+                pages.append((user_id, resource_type, page, items))
+        
+        with self.lock:
+            row = self.conn.execute('SELECT updated_at FROM sessions WHERE user_id = ?', (user_id,)).fetchone()
+            if row and row[0] > saved_at:
+                return
+            
+            self.conn.execute('BEGIN')
+            try:
+                self.conn.execute('DELETE FROM session_pages WHERE user_id = ?', (user_id,))
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO sessions (user_id, keyword, result_id, total, type_counts, view_type, updated_at) VALUES (?, ?, ?, ?, ?, NULL, ?)',
+                    (user_id, session['keyword'], session.get('result_id'), session['total'], json.dumps(session['type_counts']), saved_at)
+                )
+                self.conn.executemany('INSERT INTO session_pages (user_id, resource_type, page, items) VALUES (?, ?, ?, ?)', pages)
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        self.maybe_purge()
+    
+    def load_session(self, user_id):
+        """读取会话元数据（不包含资源列表），不存在或已过期返回 None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT keyword, result_id, total, type_counts, view_type FROM sessions WHERE user_id = ? AND updated_at > ?',
+                (user_id, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            return None
+        
+        keyword, result_id, total, type_counts, view_type = row
+        return {
+            'keyword': keyword,
+            'result_id': result_id,
+            'total': total,
+            'type_counts': json.loads(type_counts),
+            'merged_by_type': None,
+            'view_type': view_type,
+        }
+    
+    def load_page(self, user_id, resource_type, page):
+        """只读取一页资源"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT items FROM session_pages WHERE user_id = ? AND resource_type = ? AND page = ?',
+                (user_id, resource_type, page)
+            ).fetchone()
+        return [Resource.from_row(item) for item in json.loads(row[0])] if row else []
+    
+    def set_view_type(self, user_id, resource_type):
+        """记录用户当前浏览的资源类型，用于重启后恢复复制按钮"""
+        with self.lock:
+            self.conn.execute('UPDATE sessions SET view_type = ? WHERE user_id = ?', (resource_type, user_id))
+    
+    def save_result(self, cache_key, body, expires_at):
+        """保存搜索接口的原始响应"""
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO search_results (cache_key, body, expires_at) VALUES (?, ?, ?)',
+                (cache_key, body, expires_at)
+            )
+        self.maybe_purge()
+    
+    def load_result(self, cache_key, keyword=''):
+        """读取未过期的搜索结果，返回 (紧凑格式的 data, 占用内存的字节数, 过期时间) 或 None；keyword 用于结果排序"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT body, expires_at FROM search_results WHERE cache_key = ? AND expires_at > ?',
+                (cache_key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        
+        body, expires_at = row
+        data = compact_search_data(json.loads(body).get('data') or {}, keyword)
+        return data, estimate_size(data), expires_at
+    
+    def maybe_purge(self):
+        """距上次清理超过 purge_interval 时清理过期数据，长期运行时数据库不会无限增长"""
+        now = time.monotonic()
+        if now < self.next_purge:
+            return
+        self.next_purge = now + self.purge_interval
+        self.purge_expired()
+    
+    def purge_expired(self):
+        """清理过期的会话和搜索结果"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute('DELETE FROM session_pages WHERE user_id IN (SELECT user_id FROM sessions WHERE updated_at <= ?)', (now - self.ttl,))
+            self.conn.execute('DELETE FROM sessions WHERE updated_at <= ?', (now - self.ttl,))
+            self.conn.execute('DELETE FROM search_results WHERE expires_at <= ?', (now,))
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+session_db = SessionDB(SESSION_DB_PATH, SESSION_DB_TTL, SESSION_DB_PURGE_INTERVAL) if SESSION_DB_PATH else None
+logger.info(f"💾 会话持久化: {SESSION_DB_PATH if session_db else '未启用'}")
+
+# 后台任务引用，避免任务在完成前被回收
+background_tasks = set()
+# 停止时直接取消的后台任务（渐进式搜索的轮询和消息更新），其余任务（数据库写入）等待完成
+cancellable_tasks = set()
+
+def run_in_background(coro, cancellable=False):
+    """在事件循环中后台运行协程"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    if cancellable:
+        cancellable_tasks.add(task)
+        task.add_done_callback(cancellable_tasks.discard)
+    return task
+
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='db')
+
+async def run_db(func, *args):
+    """在数据库线程池中执行数据库操作，失败时只记录日志"""
+    try:
+        return await asyncio.get_running_loop().run_in_executor(db_executor, func, *args)
+    except Exception as e:
+        logger.error(f"💥 数据库操作失败 ({func.__name__}): {e}")
+        return None
+
+def build_session(keyword, merged_by_type, total, result_id=None):
+    """根据搜索结果构造会话，result_id 为共享结果集的 ID（用于页面缓存）"""
+    return {
+        'keyword': keyword,
+        'result_id': result_id,
+        'total': total,
+        'type_counts': {resource_type: len(resources) for resource_type, resources in merged_by_type.items() if resources},
+        'merged_by_type': merged_by_type,
+    }
+
+def store_session(user_id, session):
+    """保存会话到内存，并在后台写入磁盘"""
+    session_store.set(user_id, session)
+    if session_db is not None:
+        run_in_background(run_db(session_db.save_session, user_id, session, time.time()))
+
+async def get_session(user_id):
+    """读取用户会话：优先使用内存，重启或被淘汰后从磁盘恢复（资源分页按需读取）"""
+    session = session_store.get(user_id)
+    if session is not None or session_db is None:
+        return session
+    
+    session = await run_db(session_db.load_session, user_id)
+    if session is not None:
+        logger.info(f"💾 从磁盘恢复用户 {user_id} 的会话")
+        session_store.set(user_id, session)
+    return session
+
+async def get_session_page(user_id, session, resource_type, page):
+    """读取会话中某类资源的一页"""
+    merged_by_type = session['merged_by_type']
+    if merged_by_type is not None:
+        start_idx = page * ITEMS_PER_PAGE
+        return merged_by_type.get(resource_type, [])[start_idx:start_idx + ITEMS_PER_PAGE]
+    
+    if session_db is None:
+        return []
+    return await run_db(session_db.load_page, user_id, resource_type, page) or []
+
+# === Telegram 发送队列配置 ===
+# 每个聊天和全局的发送速率（条/秒），0 表示不限制
+OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', '1'))
+OUTBOUND_CHAT_BURST = int(os.getenv('OUTBOUND_CHAT_BURST', '3'))
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+# 遇到 429 时按 retry_after 等待后重试的次数
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+
+class SendBucket:
+    """发送令牌桶，reserve() 预约一个令牌并返回需要等待的秒数"""
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+    
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def reserve(self):
+        if self.rate <= 0:
+            return 0
+        self.refill()
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+    
+    def idle(self):
+        if self.rate <= 0:
+            return True
+        self.refill()
+        return self.tokens >= self.burst
+
+class OutboundJob:
+    """一次待发送的请求，factory 每次调用返回新的协程"""
+    __slots__ = ('key', 'factory', 'future')
+    
+    def __init__(self, key, factory, future):
+        self.key = key
+        self.factory = factory
+        self.future = future
+
+class OutboundChat:
+    """单个聊天的发送队列"""
+    __slots__ = ('queue', 'bucket', 'worker')
+    
+    def __init__(self, rate, burst):
+        self.queue = deque()
+        self.bucket = SendBucket(rate, burst)
+        self.worker = None
+
+class OutboundScheduler:
+    """Telegram 发送队列
+
+    每个聊天的请求按顺序发送，并限制聊天和全局的发送速率；遇到 429 时按 retry_after 等待后重试。
+    对同一条消息的编辑在发出之前会合并，只发送最新的内容，所有调用方都得到这次编辑的结果。
+    """
+    
+    def __init__(self, chat_rate, chat_burst, global_rate, max_retries, max_chats=10000):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = SendBucket(global_rate, int(global_rate))
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self.chats = {}
+        self.pending_edits = {}  # (chat_id, message_id) -> 尚未发出的编辑
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failed = 0
+    
+    async def send(self, chat_id, factory):
+        """发送新消息"""
+        return await self._submit(chat_id, None, factory)
+    
+    async def edit(self, chat_id, key, factory):
+        """编辑消息，key 相同且尚未发出的编辑会被合并"""
+        job = self.pending_edits.get(key)
+        if job is not None:
+            job.factory = factory
+            self.coalesced += 1
+            return await asyncio.shield(job.future)
+        return await self._submit(chat_id, key, factory)
+    
+    async def _submit(self, chat_id, key, factory):
+        job = OutboundJob(key, factory, asyncio.get_running_loop().create_future())
+        if key is not None:
+            self.pending_edits[key] = job
+        
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            if len(self.chats) >= self.max_chats:
+                self._prune()
+            chat = self.chats[chat_id] = OutboundChat(self.chat_rate, self.chat_burst)
+        chat.queue.append(job)
+        if chat.worker is None:
+            chat.worker = asyncio.create_task(self._drain(chat))
+        return await asyncio.shield(job.future)
+    
+    def _prune(self):
+        """清理空闲且令牌已补满的聊天"""
+        for chat_id in [chat_id for chat_id, chat in self.chats.items() if chat.worker is None and chat.bucket.idle()]:
+            del self.chats[chat_id]
+    
+    async def _drain(self, chat):
+        try:
+            while chat.queue:
+                job = chat.queue.popleft()
+                # 等待期间到达的编辑仍会合并到这个请求中
+                delay = max(chat.bucket.reserve(), self.global_bucket.reserve())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if job.key is not None and self.pending_edits.get(job.key) is job:
+                    del self.pending_edits[job.key]
+                await self._run(job)
+        finally:
+            chat.worker = None
+    
+    async def _run(self, job):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with PHASE_SECONDS.labels('telegram').time():
+                    result = await job.factory()
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    job.future.set_exception(e)
+                    return
+                self.retries += 1
+                logger.warning(f"⏳ Telegram 限流，{e.retry_after} 秒后重试")
+                await asyncio.sleep(float(e.retry_after))
+                continue
+            except BadRequest as e:
+                # 合并后的编辑可能与当前内容相同，不算失败
+                if 'not modified' in str(e).lower():
+                    job.future.set_result(None)
+                else:
+                    self.failed += 1
+                    job.future.set_exception(e)
+                return
+            except Exception as e:
+                self.failed += 1
+                job.future.set_exception(e)
+                return
+            
+            self.sent += 1
+            job.future.set_result(result)
+            return
+    
+    def stats(self):
+        return {
+            'chats': len(self.chats),
+            # 监控指标在 prometheus 的线程中抓取，先复制一份，避免事件循环同时增删聊天
+            'queued': sum(len(chat.queue) for chat in list(self.chats.values())),
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'retries': self.retries,
+            'failed': self.failed,
+        }
+
+outbound = OutboundScheduler(OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST, OUTBOUND_GLOBAL_RATE, OUTBOUND_MAX_RETRIES)
+
+async def send_reply(message, text, **kwargs):
+    """通过发送队列回复消息"""
+    return await outbound.send(message.chat_id, lambda: message.reply_text(text, **kwargs))
+
+async def edit_message(message, text, **kwargs):
+    """通过发送队列编辑消息"""
+    return await outbound.edit(message.chat_id, (message.chat_id, message.message_id), lambda: message.edit_text(text, **kwargs))
+
+async def edit_query_message(query, text, **kwargs):
+    """通过发送队列编辑回调按钮所在的消息"""
+    if query.message is not None:
+        return await edit_message(query.message, text, **kwargs)
+    # 内联消息没有 message，只能通过 inline_message_id 编辑
+    return await outbound.edit(query.from_user.id, ('inline', query.inline_message_id), lambda: query.edit_message_text(text, **kwargs))
+
+# === 搜索限流配置 ===
+# 每个用户一个令牌桶：每秒补充 RATE_LIMIT_RATE 个令牌，最多积攒 RATE_LIMIT_BURST 个，每次搜索消耗一个
+RATE_LIMIT_RATE = float(os.getenv('RATE_LIMIT_RATE', '0.2'))  # 0 表示不限流
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', '3'))
+RATE_LIMIT_MAX_USERS = int(os.getenv('RATE_LIMIT_MAX_USERS', '10000'))
+# 不受限流的管理员，逗号分隔的用户ID
+RATE_LIMIT_EXEMPT_USERS = {int(user_id) for user_id in os.getenv('RATE_LIMIT_EXEMPT_USERS', '').replace(' ', '').split(',') if user_id}
+
+class RateLimiter:
+    """按用户的令牌桶限流，长期不活跃的用户按 LRU 淘汰"""
+    
+    def __init__(self, rate, burst, exempt=(), max_users=10000):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.exempt = set(exempt)
+        self.max_users = max_users
+        self.buckets = OrderedDict()  # user_id -> [令牌数, 更新时间, 上次提示时间]
+        self.allowed = 0
+        self.limited = 0
+        self.notices = 0
+    
+    def acquire(self, user_id):
+        """尝试消耗一个令牌，成功返回 0，否则返回需要等待的秒数"""
+        if self.rate <= 0 or user_id in self.exempt:
+            self.allowed += 1
+            return 0
+        
+        now = time.monotonic()
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            bucket = [float(self.burst), now, 0.0]
+            self.buckets[user_id] = bucket
+            while len(self.buckets) > self.max_users:
+                self.buckets.popitem(last=False)
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self.buckets.move_to_end(user_id)
+        
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed += 1
+            return 0
+        
+        self.limited += 1
+        return (1 - bucket[0]) / self.rate
+    
+    def should_notify(self, user_id):
+        """被限流时是否回复提示：每个用户每补充一个令牌的时间内最多提示一次"""
+        bucket = self.buckets.get(user_id)
+        now = time.monotonic()
+        if bucket is None or now - bucket[2] < 1 / self.rate:
+            return False
+        bucket[2] = now
+        self.notices += 1
+        return True
+    
+    def stats(self):
+        return {
+            'users': len(self.buckets),
+            'allowed': self.allowed,
+            'limited': self.limited,
+            'notices': self.notices,
+        }
+
+rate_limiter = RateLimiter(RATE_LIMIT_RATE, RATE_LIMIT_BURST, RATE_LIMIT_EXEMPT_USERS, RATE_LIMIT_MAX_USERS)
+if RATE_LIMIT_RATE > 0:
+    logger.info(f"🚦 搜索限流: 每用户 {RATE_LIMIT_RATE}/秒, 突发 {RATE_LIMIT_BURST} 次, 豁免 {len(RATE_LIMIT_EXEMPT_USERS)} 人")
+
+async def check_rate_limit(update: Update):
+    """搜索前检查限流，被限流时返回 False（提示本身也限频，连续刷屏只回复一次）"""
+    user_id = update.effective_user.id
+    wait = rate_limiter.acquire(user_id)
+    if not wait:
+        return True
+    
+    logger.warning(f"🚦 用户 {user_id} 搜索过于频繁，已限流")
+    if rate_limiter.should_notify(user_id):
+        await send_reply(update.message, f"⏳ 搜索太频繁，请稍后再试（约 {int(wait) + 1} 秒后）")
+    return False
+
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """处理 /start 命令"""
+    # 权限检查
+    user_id = update.effective_user.id
+    if not check_user_permission(user_id):
+        logger.warning(f"❌ 用户 {user_id} 无权限访问")
+        await send_reply(update.message, "❌ 您无权使用此机器人")
+        return
+    
+    menu_buttons = [
+        ["🔍 开始搜索", "📋 使用帮助"],
+        ["⚡ 快速搜索", "📊 机器人状态"]
+    ]
+    reply_markup = ReplyKeyboardMarkup(menu_buttons, resize_keyboard=True)
+    
+    await send_reply(
+        update.message,
+        "🔍 盘搜机器人\n\n直接发送关键词即可搜索资源\n\n例如：\n• 钢铁侠\n• 天下第一\n\n支持所有常见的搜索关键词！",
+        reply_markup=reply_markup
+    )
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """处理搜索命令 /search"""
+    # 权限检查
+    user_id = update.effective_user.id
+    if not check_user_permission(user_id):
+        logger.warning(f"❌ 用户 {user_id} 无权限访问")
+        await send_reply(update.message, "❌ 您无权使用此机器人")
+        return
+    
+    if not context.args:
+        await send_reply(update.message, "请提供搜索关键词，例如：/search 钢铁侠")
+        return
+    
+    keyword = ' '.join(context.args)
+    if not await check_rate_limit(update):
+        return
+    await perform_search(update, keyword, context)
+
+async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """处理普通消息作为搜索请求"""
+    # 权限检查
+    user_id = update.effective_user.id
+    if not check_user_permission(user_id):
+        logger.warning(f"❌ 用户 {user_id} 无权限访问")
+        await send_reply(update.message, "❌ 您无权使用此机器人")
+        return
+    
+    keyword = update.message.text.strip()
+    logger.info(f"📨 收到用户 {user_id} 消息: {keyword}")
+    
+    # 处理菜单按钮点击
+    if keyword == "🔍 开始搜索":
+        await start_command(update, context)
+        return
+    elif keyword == "📋 使用帮助":
+        await help_command(update, context)
+        return
+    elif keyword == "⚡ 快速搜索":
+        await show_quick_search_menu(update, context)
+        return
+    elif keyword == "📊 机器人状态":
+        await stats_command(update, context)
+        return
+    
+    # 忽略命令
+    if keyword.startswith('/'):
+        return
+    
+    if not await check_rate_limit(update):
+        return
+    
+    # 选择了快速搜索时，本次搜索只搜索该网盘类型
+    quick_search_type = context.user_data.pop('quick_search_type', None)
+    if quick_search_type:
+        await perform_quick_search(update, keyword, quick_search_type, context)
+        return
+        
+    await perform_search(update, keyword, context)
+
+async def show_quick_search_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """显示快速搜索菜单"""
+    keyboard = []
+    row = []
+    
+    for display_name, resource_type in QUICK_SEARCH_MENU.items():
+        button = InlineKeyboardButton(display_name, callback_data=encode_callback('Q', resource_type=resource_type))
+        row.append(button)
+        
+        if len(row) == 2:
+            keyboard.append(row)
+            row = []
+    
+    if row:
+        keyboard.append(row)
+    
+    keyboard.append([InlineKeyboardButton("🔙 返回主菜单", callback_data='M')])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    await send_reply(
+        update.message,
+        "⚡ 快速搜索\n\n请选择要搜索的网盘类型：\n\n选择后直接发送关键词即可搜索该类型的资源",
+        reply_markup=reply_markup
+    )
+
+async def handle_quick_search(update: Update, handle, context: ContextTypes.DEFAULT_TYPE):
+    """处理快速搜索选择"""
+    query = update.callback_query
+    await query.answer()
+    
+    resource_type = handle.resource_type
+    context.user_data['quick_search_type'] = resource_type
+    display_name = get_resource_display_name(resource_type)
+    
+    await edit_query_message(
+        query,
+        f"✅ 已选择: {display_name}\n\n现在请直接发送搜索关键词，我将只搜索{display_name}的资源"
+    )
+
+async def perform_search(update: Update, keyword: str, context: ContextTypes.DEFAULT_TYPE):
+    """执行搜索并返回结果"""
+    try:
+        user_id = update.effective_user.id
+        logger.info(f"🎯 用户 {user_id} 执行搜索，关键词: {keyword}", extra={'event': 'search', 'user_id': user_id, 'keyword': keyword, 'canonical': normalize_keyword(keyword)})
+        keyword_tracker.record(keyword)
+        
+        message = await send_reply(update.message, f"🔍 正在搜索: {keyword}...")
+        
+        if PROGRESSIVE_SEARCH and await show_progressive_results(update, keyword, message, context):
+            return
+        
+        try:
+            search_data = await get_search_data(keyword)
+        except SearchError as e:
+            logger.warning(str(e))
+            await edit_message(message, str(e))
+            return
+        
+        logger.info("✅ 搜索成功，准备显示结果")
+        await show_resource_types(update, keyword, search_data, message, context)
+            
+    except Exception as e:
+        logger.exception(f"💥 搜索时发生错误: {str(e)}")
+        record_handler_error('search')
+        await send_reply(update.message, f"❌ 搜索时发生错误: {str(e)}")
+
+# === 渐进式搜索配置 ===
+# 开启后先展示 TG 频道的结果，再在后台轮询后端，随着插件结果到达更新同一条消息
+PROGRESSIVE_SEARCH = os.getenv('PROGRESSIVE_SEARCH', 'false').lower() in ('1', 'true', 'yes')
+PROGRESSIVE_POLL_INTERVAL = float(os.getenv('PROGRESSIVE_POLL_INTERVAL', '5'))
+PROGRESSIVE_MAX_DURATION = float(os.getenv('PROGRESSIVE_MAX_DURATION', '45'))
+# 两次编辑同一条消息的最小间隔（秒），避免触发 Telegram 的编辑频率限制
+PROGRESSIVE_EDIT_INTERVAL = float(os.getenv('PROGRESSIVE_EDIT_INTERVAL', '3'))
+
+# 进行中的渐进式搜索：缓存键 -> ProgressiveSearch
+progressive_searches = {}
+
+class ProgressiveSearch:
+    """同一关键词的渐进式搜索：所有用户共享首批请求、完整搜索和同一个轮询任务
+
+    完整搜索在首批请求之前登记到 inflight_searches，普通搜索会直接合并进来。
+    每次结果增加时唤醒等待中的用户，没有用户在看时停止轮询。
+    """
+    
+    def __init__(self, keyword, cache_key):
+        self.keyword = keyword
+        self.cache_key = cache_key
+        self.full = start_search(keyword, cache_key)
+        self.first_batch = asyncio.create_task(request_search_data(keyword, src='tg'))
+        # 目前最完整的结果，完整搜索返回前为 None
+        self.data = None
+        self.done = False
+        self.viewers = 0
+        self.changed = asyncio.Event()
+        self.poller = run_in_background(self.poll(), cancellable=True)
+    
+    def publish(self, data):
+        """更新结果并唤醒等待的用户"""
+        self.data = data
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+    
+    async def poll(self):
+        """等待完整结果，再轮询后端直到连续两次没有新结果、到达时限或没有用户在看"""
+        deadline = time.monotonic() + PROGRESSIVE_MAX_DURATION
+        try:
+            self.publish(await asyncio.shield(self.full))
+            stable_polls = 0
+            while stable_polls < 2 and time.monotonic() + PROGRESSIVE_POLL_INTERVAL <= deadline:
+                await asyncio.sleep(PROGRESSIVE_POLL_INTERVAL)
+                if not self.viewers:
+                    break
+                latest, response = await request_search_data(self.keyword)
+                if latest['total'] > self.data['total']:
+                    store_search_data(self.cache_key, latest, response)
+                    self.publish(latest)
+                    stable_polls = 0
+                else:
+                    stable_polls += 1
+        except SearchError as e:
+            logger.warning(f"⚠️ 补充搜索结果失败: {e}")
+        except Exception as e:
+            logger.exception(f"💥 渐进式搜索出错: {str(e)}")
+        finally:
+            self.done = True
+            self.publish(self.data)
+            if progressive_searches.get(self.cache_key) is self:
+                del progressive_searches[self.cache_key]
+
+async def show_progressive_results(update: Update, keyword: str, message, context: ContextTypes.DEFAULT_TYPE):
+    """渐进式搜索：先展示 TG 频道的首批结果，完整结果在后台补充
+
+    已有缓存、相同的普通搜索正在进行或首批结果为空时返回 False，由调用方走普通搜索流程。
+    """
+    cache_key = search_cache_key(keyword)
+    if cache_key in search_cache:
+        return False
+    search = progressive_searches.get(cache_key)
+    if search is None:
+        if cache_key in inflight_searches:
+            return False
+        search = progressive_searches[cache_key] = ProgressiveSearch(keyword, cache_key)
+    
+    try:
+        partial, _ = await asyncio.shield(search.first_batch)
+    except SearchError as e:
+        logger.warning(f"⚠️ 获取首批结果失败: {e}")
+        return False
+    
+    # 后加入的用户可能已经可以拿到更完整的结果
+    if search.data is not None and search.data['total'] >= partial['total']:
+        partial = search.data
+    if partial['total'] == 0:
+        return False
+    
+    logger.info(f"⚡ 首批结果: {partial['total']} 个资源，后台继续获取")
+    session = await show_resource_types(update, keyword, partial, message, context, searching=not search.done)
+    if session is None:
+        return False
+    
+    if not search.done:
+        run_in_background(refresh_progressive_results(update, keyword, search, message, session, time.monotonic()), cancellable=True)
+    return True
+
+async def refresh_progressive_results(update: Update, keyword: str, search: ProgressiveSearch, message, session: dict, last_edit: float):
+    """等待共享的渐进式搜索，结果增加时节流地编辑同一条消息"""
+    user_id = update.effective_user.id
+    
+    def still_viewing():
+        # 用户开始新的搜索或已进入某个类型的分页时，不再改动这条消息
+        return session_store.get(user_id) is session and not session.get('view_type')
+    
+    async def wait_edit_interval():
+        await asyncio.sleep(max(0, last_edit + PROGRESSIVE_EDIT_INTERVAL - time.monotonic()))
+    
+    # 消息上是否还显示着"正在获取更多结果"的提示
+    hint_shown = True
+    search.viewers += 1
+    try:
+        while True:
+            changed = search.changed
+            data = search.data
+            if data is not None and data['total'] > session['total']:
+                await wait_edit_interval()
+                if not still_viewing():
+                    return
+                session = build_session(keyword, data['merged_by_type'], data['total'], data['id'])
+                store_session(user_id, session)
+                hint_shown = not search.done
+                await render_resource_types(message, session, user_id, searching=hint_shown)
+                last_edit = time.monotonic()
+                logger.info(f"⚡ 更新搜索结果: {data['total']} 个资源")
+                continue
+            if search.done:
+                break
+            await changed.wait()
+            if not still_viewing():
+                return
+    except Exception as e:
+        logger.exception(f"💥 渐进式搜索出错: {str(e)}")
+    finally:
+        search.viewers -= 1
+    
+    # 去掉"正在获取更多结果"的提示
+    try:
+        await wait_edit_interval()
+        if hint_shown and still_viewing():
+            await render_resource_types(message, session, user_id)
+    except Exception as e:
+        logger.exception(f"💥 更新搜索结果消息失败: {str(e)}")
+
+async def perform_normal_search(update: Update, keyword: str, context: ContextTypes.DEFAULT_TYPE):
+    """执行普通搜索（所有类型）"""
+    message = await send_reply(update.message, f"🔍 正在搜索: {keyword}...")
+    
+    try:
+        search_data = await get_search_data(keyword)
+    except SearchError as e:
+        await edit_message(message, str(e))
+        return
+    
+    await show_resource_types(update, keyword, search_data, message, context)
+
+async def perform_quick_search(update: Update, keyword: str, resource_type: str, context: ContextTypes.DEFAULT_TYPE):
+    """执行快速搜索（特定类型，由后端按类型过滤）"""
+    try:
+        user_id = update.effective_user.id
+        logger.info(f"🎯 用户 {user_id} 执行快速搜索({resource_type})，关键词: {keyword}",
+                    extra={'event': 'quick_search', 'user_id': user_id, 'keyword': keyword, 'canonical': normalize_keyword(keyword), 'resource_type': resource_type})
+        # 预热的是全类型结果，快速搜索可以直接从中取出该类型
+        keyword_tracker.record(keyword)
+        
+        message = await send_reply(update.message, f"🔍 正在搜索{get_resource_display_name(resource_type)}资源: {keyword}...")
+        
+        try:
+            search_data = await get_search_data(keyword, resource_type)
+        except SearchError as e:
+            logger.warning(str(e))
+            await edit_message(message, str(e))
+            return
+        
+        merged_by_type = search_data.get('merged_by_type', {})
+        
+        if resource_type in merged_by_type and merged_by_type[resource_type]:
+            resources = merged_by_type[resource_type]
+            await show_quick_search_results(update, keyword, resource_type, resources, message, context, search_data['id'])
+        else:
+            display_name = get_resource_display_name(resource_type)
+            await edit_message(message, f"🔍 未找到{display_name}关于『{keyword}』的资源")
+            
+    except Exception as e:
+        logger.exception(f"💥 快速搜索时发生错误: {str(e)}")
+        record_handler_error('quick_search')
+        await send_reply(update.message, f"❌ 搜索时发生错误: {str(e)}")
+
+async def show_quick_search_results(update: Update, keyword: str, resource_type: str, resources: list, message, context: ContextTypes.DEFAULT_TYPE, result_id=None):
+    """显示快速搜索结果"""
+    try:
+        display_name = get_resource_display_name(resource_type)
+        
+        user_id = update.effective_user.id
+        session = build_session(keyword, {resource_type: resources}, len(resources), result_id)
+        store_session(user_id, session)
+        
+        await show_resource_page(message, session, resource_type, 0, user_id, context)
+        
+    except Exception as e:
+        await edit_message(message, f"❌ 显示搜索结果时出错: {str(e)}")
+
+async def show_resource_types(update: Update, keyword: str, data: dict, message, context: ContextTypes.DEFAULT_TYPE, searching=False):
+    """保存搜索结果并显示资源类型选择按钮，返回新的会话"""
+    try:
+        total = data.get('total', 0)
+        merged_by_type = data.get('merged_by_type', {})
+        
+        if total == 0:
+            await edit_message(message, f"🔍 未找到关于『{keyword}』的资源")
+            return None
+        
+        user_id = update.effective_user.id
+        session = build_session(keyword, merged_by_type, total, data.get('id'))
+        store_session(user_id, session)
+        
+        await render_resource_types(message, session, user_id, searching)
+        return session
+        
+    except Exception as e:
+        await edit_message(message, f"❌ 显示资源类型时出错: {str(e)}")
+        return None
+
+async def render_resource_types(message, session: dict, user_id: int, searching=False):
+    """根据会话中的类型统计渲染资源类型按钮，searching 为 True 时提示仍在获取更多结果"""
+    keyword = session['keyword']
+    total = session['total']
+    
+    keyboard = []
+    row = []
+    
+    for resource_type, resources_count in session['type_counts'].items():
+        display_name = get_resource_display_name(resource_type)
+        button_text = f"{display_name}({resources_count})"
+        callback_data = encode_callback('T', user_id, session, resource_type)
+        row.append(InlineKeyboardButton(button_text, callback_data=callback_data))
+        
+        if len(row) == 2:
+            keyboard.append(row)
+            row = []
+    
+    if row:
+        keyboard.append(row)
+    
+    keyboard.append([InlineKeyboardButton("📊 显示所有类型统计", callback_data=encode_callback('S', user_id, session))])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    response_text = f"🔍 搜索『{keyword}』结果\n\n📊 总计: {total} 个资源\n\n📁 请选择资源类型查看详情:"
+    if searching:
+        response_text += "\n\n⏳ 正在获取更多结果..."
+    
+    await edit_message(message, response_text, reply_markup=reply_markup)
+
+async def get_callback_session(query, handle):
+    """读取按钮所属的会话；会话已过期或已被新的搜索替换时提示用户并返回 None"""
+    user_data = await get_session(handle.user_id)
+    if not user_data or result_tag(user_data) != handle.result_tag:
+        await edit_query_message(query, "❌ 会话已过期，请重新搜索")
+        return None
+    return user_data
+
+async def show_resource_details(update: Update, handle, context: ContextTypes.DEFAULT_TYPE):
+    """显示指定资源类型的详细结果"""
+    try:
+        query = update.callback_query
+        await query.answer()
+        
+        user_data = await get_callback_session(query, handle)
+        if not user_data:
+            return
+        
+        resource_type = handle.resource_type
+        if not user_data['type_counts'].get(resource_type):
+            await edit_query_message(query, f"❌ 未找到 {resource_type} 类型的资源")
+            return
+        
+        await show_resource_page(query, user_data, resource_type, 0, handle.user_id, context)
+        
+    except Exception as e:
+        record_handler_error('type')
+        await edit_query_message(query, f"❌ 显示资源详情时出错: {str(e)}")
+
+def render_page_items(page_resources: list, start_idx: int):
+    """渲染一页资源的正文，返回 (文本, [(序号, 可复制链接)])；与用户无关，可在用户间共享"""
+    text = ""
+    copy_links = []
+    
+    for i, resource in enumerate(page_resources, start=start_idx + 1):
+        note = resource.note
+        url = resource.url
+        password = resource.password
+        source = resource.source
+        datetime_str = resource.datetime[:10]
+        
+        if len(note) > 60:
+            note = note[:60] + "..."
+        
+        note = note.replace('*', '×').replace('_', ' ').replace('`', "'").replace('[', '(').replace(']', ')')
+        
+        text += f"{i}. {note}\n"
+        
+        if url:
+            if url.startswith('magnet:'):
+                text += f"   🧲 {url}\n"
+            elif url.startswith('thunder://'):
+                text += f"   ⚡ {url}\n"
+            else:
+                text += f"   🔗 {url}\n"
+        
+        if password:
+            safe_password = password.replace('_', '\\_').replace('*', '\\*').replace('`', '\\`')
+            text += f"   🔐 密码: {safe_password}\n"
+        
+        info_parts = []
+        if datetime_str:
+            info_parts.append(f"⏰ {datetime_str}")
+        if source:
+            safe_source = source.replace('_', '\\_').replace('*', '\\*').replace('`', '\\`')
+            if source.startswith('tg:'):
+                info_parts.append(f"📡 {safe_source[3:]}")
+            elif source.startswith('plugin:'):
+                info_parts.append(f"🔌 {safe_source[7:]}")
+            else:
+                info_parts.append(f"📡 {safe_source}")
+        
+        if info_parts:
+            text += f"   {' | '.join(info_parts)}\n"
+        
+        text += "\n"
+        
+        if url and (url.startswith('magnet:') or url.startswith('thunder://')):
+            copy_links.append((i, url))
+    
+    return text, copy_links
+
+async def show_resource_page(query, user_data: dict, resource_type: str, page: int, user_id: int, context: ContextTypes.DEFAULT_TYPE):
+    """显示资源分页"""
+    try:
+        start_idx = page * ITEMS_PER_PAGE
+        end_idx = start_idx + ITEMS_PER_PAGE
+        resources_count = user_data['type_counts'].get(resource_type, 0)
+        
+        # 同一结果集的页面只渲染一次，热门结果翻页只需查表
+        result_id = user_data.get('result_id')
+        rendered = page_cache.get(result_id, resource_type, page) if result_id else None
+        if rendered is None:
+            page_resources = await get_session_page(user_id, user_data, resource_type, page)
+            rendered = render_page_items(page_resources, start_idx)
+            if result_id:
+                page_cache.set(result_id, resource_type, page, rendered)
+        body_text, copy_links = rendered
+        
+        keyword = user_data['keyword']
+        
+        display_name = get_resource_display_name(resource_type)
+        response_text = f"🔍 {display_name}资源 - 『{keyword}』\n\n"
+        response_text += f"📄 第 {page + 1}/{(resources_count - 1) // ITEMS_PER_PAGE + 1} 页 | 共 {resources_count} 个资源\n\n"
+        response_text += body_text
+        
+        keyboard = []
+        # 复制按钮只记录页码和页内序号，点击时再从会话中取出链接
+        for i, url in copy_links:
+            button_text = f"Link-{i}"
+            callback_data = encode_callback('C', user_id, user_data, resource_type, page, i - start_idx - 1)
+            keyboard.append([InlineKeyboardButton(button_text, callback_data=callback_data)])
+        
+        if user_data.get('view_type') != resource_type:
+            user_data['view_type'] = resource_type
+            if session_db is not None:
+                run_in_background(run_db(session_db.set_view_type, user_id, resource_type))
+        
+        nav_buttons = []
+        if page > 0:
+            nav_buttons.append(InlineKeyboardButton("⬅️ 上一页", callback_data=encode_callback('P', user_id, user_data, resource_type, page - 1)))
+        
+        if end_idx < resources_count:
+            nav_buttons.append(InlineKeyboardButton("下一页 ➡️", callback_data=encode_callback('P', user_id, user_data, resource_type, page + 1)))
+        
+        if nav_buttons:
+            keyboard.append(nav_buttons)
+        
+        keyboard.append([InlineKeyboardButton("🔙 返回类型选择", callback_data=encode_callback('B', user_id, user_data))])
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        if hasattr(query, 'edit_message_text'):
+            await edit_query_message(query, response_text, reply_markup=reply_markup, parse_mode=None)
+        else:
+            await edit_message(query, response_text, reply_markup=reply_markup, parse_mode=None)
+        
+    except Exception as e:
+        record_handler_error('page')
+        error_msg = f"❌ 显示资源页面时出错: {str(e)}"
+        if hasattr(query, 'edit_message_text'):
+            await edit_query_message(query, error_msg, parse_mode=None)
+        else:
+            await edit_message(query, error_msg, parse_mode=None)
+
+async def show_page_request(update: Update, handle, context: ContextTypes.DEFAULT_TYPE):
+    """处理翻页按钮"""
+    query = update.callback_query
+    user_data = await get_session(handle.user_id)
+    if not user_data or result_tag(user_data) != handle.result_tag:
+        await query.answer()
+        await edit_query_message(query, "❌ 会话已过期，请重新搜索")
+        return
+    
+    await show_resource_page(query, user_data, handle.resource_type, handle.page, handle.user_id, context)
+
+async def handle_copy_request(update: Update, handle, context: ContextTypes.DEFAULT_TYPE):
+    """处理复制请求"""
+    query = update.callback_query
+    await query.answer()
+    
+    try:
+        user_data = await get_session(handle.user_id)
+        if not user_data or result_tag(user_data) != handle.result_tag:
+            await query.answer("❌ 会话已过期", show_alert=True)
+            return
+        
+        # 按页码和页内序号从会话（或磁盘）中取出链接，只允许复制磁力和迅雷链接
+        url = None
+        page_resources = await get_session_page(handle.user_id, user_data, handle.resource_type, handle.page)
+        if handle.item < len(page_resources):
+            url = page_resources[handle.item].url
+            if not (url.startswith('magnet:') or url.startswith('thunder://')):
+                url = None
+        if not url:
+            await query.answer("❌ 链接不存在", show_alert=True)
+            return
+        
+        await send_reply(query.message, url)
+        
+    except Exception as e:
+        record_handler_error('copy')
+        await query.answer("❌ 复制失败", show_alert=True)
+
+async def show_stats(update: Update, handle, context: ContextTypes.DEFAULT_TYPE):
+    """显示所有类型统计"""
+    try:
+        query = update.callback_query
+        await query.answer()
+        
+        user_data = await get_callback_session(query, handle)
+        if not user_data:
+            return
+        
+        keyword = user_data['keyword']
+        total = user_data['total']
+        
+        response_text = f"🔍 搜索『{keyword}』统计\n\n"
+        response_text += f"📊 总计: {total} 个资源\n\n"
+        response_text += "📁 资源类型分布:\n"
+        
+        for resource_type, resources_count in user_data['type_counts'].items():
+            display_name = get_resource_display_name(resource_type)
+            response_text += f"• {display_name}: {resources_count} 个资源\n"
+        
+        keyboard = [[InlineKeyboardButton("🔙 返回类型选择", callback_data=encode_callback('B', handle.user_id, user_data))]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await edit_query_message(query, response_text, reply_markup=reply_markup)
+        
+    except Exception as e:
+        record_handler_error('stats')
+        await edit_query_message(query, f"❌ 显示统计时出错: {str(e)}")
+
+async def back_to_types(update: Update, handle, context: ContextTypes.DEFAULT_TYPE):
+    """返回到类型选择"""
+    try:
+        query = update.callback_query
+        await query.answer()
+        
+        user_data = await get_callback_session(query, handle)
+        if not user_data:
+            return
+        
+        await render_resource_types(query.message, user_data, handle.user_id)
+        
+    except Exception as e:
+        record_handler_error('back')
+        await edit_query_message(query, f"❌ 返回类型选择时出错: {str(e)}")
+
+async def back_to_main(update: Update, handle, context: ContextTypes.DEFAULT_TYPE):
+    """返回主菜单"""
+    await edit_query_message(update.callback_query, "已返回主菜单")
+
+# 回调动作前缀 -> (处理函数, 监控指标中的名称)，按前缀查表分发
+CALLBACK_ROUTES = {
+    'T': (show_resource_details, 'type'),
+    'P': (show_page_request, 'page'),
+    'S': (show_stats, 'stats'),
+    'B': (back_to_types, 'back'),
+    'Q': (handle_quick_search, 'quick'),
+    'C': (handle_copy_request, 'copy'),
+    'M': (back_to_main, 'back'),
+}
+
+async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """处理按钮回调"""
+    query = update.callback_query
+    action, handle = decode_callback(query.data or '')
+    route = CALLBACK_ROUTES.get(action)
+    # 无法解析的按钮（包括升级前旧格式的按钮）提示重新搜索
+    if route is None or (handle is None and action != 'M'):
+        await query.answer("❌ 按钮已失效，请重新搜索", show_alert=True)
+        return
+    
+    handler, kind = route
+    try:
+        await handler(update, handle, context)
+    except Exception as e:
+        record_handler_error(kind)
+        await edit_query_message(query, f"❌ 处理按钮时出错: {str(e)}")
+
+# === 内联查询配置 ===
+# 在任意聊天中输入 "@机器人 关键词" 直接返回结果（需要先在 BotFather 中用 /setinline 开启内联模式）
+# 同一用户连续输入时，只有停止输入 INLINE_DEBOUNCE 秒后的最后一个查询才会请求后端
+INLINE_DEBOUNCE = float(os.getenv('INLINE_DEBOUNCE', '0.8'))
+# Telegram 服务器缓存内联结果的时间（秒）；未设置白名单时结果与用户无关，所有用户共享
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '300'))
+# 每次返回的结果数，Telegram 最多 50 条，向下滚动时通过 offset 获取下一批
+INLINE_PAGE_SIZE = min(int(os.getenv('INLINE_PAGE_SIZE', '20')), 50)
+
+# 等待防抖的内联查询：用户 ID -> 定时器，新的输入到达时取消
+inline_pending = {}
+
+def slice_results(merged_by_type, start, count):
+    """按类型顺序取出第 start 条起的 count 条资源，返回 [(类型, 资源)]，跳过的类型不逐条遍历"""
+    results = []
+    for resource_type, resources in merged_by_type.items():
+        if start >= len(resources):
+            start -= len(resources)
+            continue
+        for resource in resources[start:start + count - len(results)]:
+            results.append((resource_type, resource))
+        start = 0
+        if len(results) >= count:
+            break
+    return results
+
+def build_inline_result(result_id, resource_type, resource):
+    """把一条资源转换为内联结果，选中后发送标题、链接和密码"""
+    display_name = get_resource_display_name(resource_type)
+    text = f"{resource.note}\n{resource.url}"
+    if resource.password:
+        text += f"\n🔐 密码: {resource.password}"
+    description = ' | '.join(part for part in (display_name, resource.datetime[:10], resource.source) if part)
+    return InlineQueryResultArticle(
+        id=result_id,
+        title=resource.note[:100],
+        description=description,
+        input_message_content=InputTextMessageContent(text, disable_web_page_preview=True),
+    )
+
+async def answer_inline(query, results, next_offset='', cache_time=INLINE_CACHE_TIME):
+    """回答内联查询；查询已过期（用户继续输入或超过 Telegram 的时限）时忽略
+
+    设置了白名单时按用户缓存，避免 Telegram 把白名单用户的结果返回给其他用户（或反过来）。
+    """
+    try:
+        with PHASE_SECONDS.labels('telegram').time():
+            await query.answer(results, cache_time=cache_time, next_offset=next_offset, is_personal=bool(ALLOWED_USER_IDS))
+    except BadRequest as e:
+        logger.debug(f"⌛ 内联查询已过期: {e}")
+
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """处理内联查询：命中缓存或已有相同搜索在进行时立即返回，否则防抖后再搜索
+
+    防抖用定时器实现，处理器立即返回，用户连续输入时不会占用并发处理名额。
+    """
+    query = update.inline_query
+    user_id = query.from_user.id
+    keyword = query.query.strip()
+    # 新的输入取代该用户还在等待的查询
+    pending = inline_pending.pop(user_id, None)
+    if pending is not None:
+        pending.cancel()
+    if not keyword or not check_user_permission(user_id):
+        await answer_inline(query, [], cache_time=0)
+        return
+    
+    cache_key = search_cache_key(keyword)
+    if cache_key in search_cache or cache_key in inflight_searches:
+        await answer_inline_search(query, keyword)
+        return
+    inline_pending[user_id] = asyncio.get_running_loop().call_later(INLINE_DEBOUNCE, start_debounced_inline, query, keyword)
+
+def start_debounced_inline(query, keyword: str):
+    """防抖结束：该用户在 INLINE_DEBOUNCE 秒内没有新的输入"""
+    inline_pending.pop(query.from_user.id, None)
+    run_in_background(debounced_inline_search(query, keyword), cancellable=True)
+
+async def debounced_inline_search(query, keyword: str):
+    user_id = query.from_user.id
+    # 防抖后仍需请求后端时才消耗限流令牌
+    if search_cache_key(keyword) not in search_cache and rate_limiter.acquire(user_id):
+        await answer_inline(query, [], cache_time=0)
+        return
+    logger.info(f"🎯 用户 {user_id} 执行内联搜索，关键词: {keyword}", extra={'event': 'inline_search', 'user_id': user_id, 'keyword': keyword, 'canonical': normalize_keyword(keyword)})
+    await answer_inline_search(query, keyword)
+
+async def answer_inline_search(query, keyword: str):
+    """搜索（优先读缓存）并返回 offset 对应的一批结果"""
+    if not query.offset:
+        keyword_tracker.record(keyword)
+    try:
+        data = await get_search_data(keyword)
+    except SearchError as e:
+        logger.warning(str(e))
+        await answer_inline(query, [], cache_time=0)
+        return
+    except Exception as e:
+        logger.exception(f"💥 内联搜索时发生错误: {str(e)}")
+        record_handler_error('inline')
+        await answer_inline(query, [], cache_time=0)
+        return
+    
+    start = int(query.offset) if query.offset.isdigit() else 0
+    page = slice_results(data['merged_by_type'], start, INLINE_PAGE_SIZE)
+    results = [build_inline_result(str(start + i), resource_type, resource) for i, (resource_type, resource) in enumerate(page)]
+    end = start + len(page)
+    next_offset = str(end) if page and end < sum(len(resources) for resources in data['merged_by_type'].values()) else ''
+    await answer_inline(query, results, next_offset)
+
+# === 缓存预热配置 ===
+# 按实时流量统计关键词热度，定期在后端空闲时把最热门的关键词预先搜索到缓存中；间隔为 0 时关闭
+CACHE_WARM_INTERVAL = int(os.getenv('CACHE_WARM_INTERVAL', '120'))
+# 每次预热的关键词数上限，以及至少被搜索过几次才预热
+CACHE_WARM_TOP_N = int(os.getenv('CACHE_WARM_TOP_N', '20'))
+CACHE_WARM_MIN_HITS = float(os.getenv('CACHE_WARM_MIN_HITS', '2'))
+# 同时进行的预热搜索数
+CACHE_WARM_CONCURRENCY = int(os.getenv('CACHE_WARM_CONCURRENCY', '2'))
+# 每小时最多用于预热的后端搜索次数
+CACHE_WARM_HOURLY_BUDGET = int(os.getenv('CACHE_WARM_HOURLY_BUDGET', '120'))
+# 进行中和排队的后端请求达到此数时视为繁忙，暂停预热
+CACHE_WARM_MAX_BACKEND_LOAD = int(os.getenv('CACHE_WARM_MAX_BACKEND_LOAD', '2'))
+# 每次预热后热度乘以该系数，旧的热门关键词逐渐让位
+CACHE_WARM_DECAY = float(os.getenv('CACHE_WARM_DECAY', '0.5'))
+# 跟踪的关键词数上限
+KEYWORD_TRACKER_MAX_KEYWORDS = 5000
+
+class KeywordTracker:
+    """关键词热度：每次搜索加 1，每次预热后按系数衰减，超出上限时丢弃热度最低的关键词"""
+    
+    def __init__(self, max_keywords, decay):
+        self.max_keywords = max_keywords
+        self.decay = decay
+        # 缓存键 -> [热度, 最近一次的原始关键词]
+        self.scores = {}
+    
+    def record(self, keyword):
+        cache_key = search_cache_key(keyword)
+        entry = self.scores.get(cache_key)
+        if entry is None:
+            if len(self.scores) >= self.max_keywords:
+                del self.scores[min(self.scores, key=lambda key: self.scores[key][0])]
+            self.scores[cache_key] = [1.0, keyword]
+        else:
+            entry[0] += 1
+            entry[1] = keyword
+    
+    def top(self, count, min_score):
+        """热度最高的 count 个关键词，返回 [(缓存键, 关键词)]"""
+        hot = heapq.nlargest(count, self.scores.items(), key=lambda item: item[1][0])
+        return [(cache_key, keyword) for cache_key, (score, keyword) in hot if score >= min_score]
+    
+    def apply_decay(self, min_score=0.1):
+        for cache_key in list(self.scores):
+            entry = self.scores[cache_key]
+            entry[0] *= self.decay
+            if entry[0] < min_score:
+                del self.scores[cache_key]
+
+keyword_tracker = KeywordTracker(KEYWORD_TRACKER_MAX_KEYWORDS, CACHE_WARM_DECAY)
+# 最近一小时内预热搜索的时间，用于限制预热预算
+cache_warm_history = deque()
+warm_stats = {'runs': 0, 'warmed': 0, 'skipped_busy': 0, 'over_budget': 0}
+
+def backend_busy():
+    backend = backend_admission.stats()
+    return backend['active'] + backend['waiting'] >= CACHE_WARM_MAX_BACKEND_LOAD
+
+def take_warm_budget():
+    """占用一次预热预算，本小时预算已用完时返回 False"""
+    now = time.monotonic()
+    while cache_warm_history and cache_warm_history[0] <= now - 3600:
+        cache_warm_history.popleft()
+    if len(cache_warm_history) >= CACHE_WARM_HOURLY_BUDGET:
+        return False
+    cache_warm_history.append(now)
+    return True
+
+async def warm_keyword(keyword: str, cache_key: str):
+    """预热一个关键词：跳过磁盘缓存直接请求后端，期间用户的相同搜索合并到这个请求"""
+    task = asyncio.create_task(fetch_search_data(keyword, cache_key, refresh=True))
+    inflight_searches[cache_key] = task
+    task.add_done_callback(lambda done: finish_inflight_search(cache_key, done))
+    await task
+
+async def warm_cache_job(context: ContextTypes.DEFAULT_TYPE):
+    """定时任务：预热缓存中缺失或在下次预热前会过期的热门关键词"""
+    warm_stats['runs'] += 1
+    candidates = [
+        (cache_key, keyword) for cache_key, keyword in keyword_tracker.top(CACHE_WARM_TOP_N, CACHE_WARM_MIN_HITS)
+        if search_cache.expires_in(cache_key) < CACHE_WARM_INTERVAL and cache_key not in inflight_searches
+    ]
+    keyword_tracker.apply_decay()
+    if not candidates:
+        return
+    
+    pending = iter(candidates)
+    warmed = []
+    
+    async def worker():
+        for cache_key, keyword in pending:
+            # 用户已经在搜索这个关键词，不需要预热，也不占用预算
+            if cache_key in inflight_searches:
+                continue
+            if backend_busy():
+                warm_stats['skipped_busy'] += 1
+                return
+            if not take_warm_budget():
+                warm_stats['over_budget'] += 1
+                return
+            try:
+                await warm_keyword(keyword, cache_key)
+            except SearchError as e:
+                # 后端出错或繁忙，本轮不再继续
+                logger.warning(f"🔥 预热 {cache_key} 失败: {e}")
+                return
+            except Exception as e:
+                # 单个关键词的意外错误（如响应无法解析）不影响其余关键词
+                logger.exception(f"💥 预热 {cache_key} 时发生错误: {str(e)}")
+                continue
+            warmed.append(cache_key)
+    
+    await asyncio.gather(*[worker() for _ in range(CACHE_WARM_CONCURRENCY)])
+    warm_stats['warmed'] += len(warmed)
+    if warmed:
+        logger.info(f"🔥 预热缓存 {len(warmed)}/{len(candidates)} 个热门关键词: {', '.join(warmed)}")
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """帮助命令"""
+    # 权限检查
+    user_id = update.effective_user.id
+    if not check_user_permission(user_id):
+        logger.warning(f"❌ 用户 {user_id} 无权限访问")
+        await send_reply(update.message, "❌ 您无权使用此机器人")
+        return
+    
+    menu_buttons = [
+        ["🔍 开始搜索", "📋 使用帮助"],
+        ["⚡ 快速搜索", "📊 机器人状态"]
+    ]
+    reply_markup = ReplyKeyboardMarkup(menu_buttons, resize_keyboard=True)
+    
+    await send_reply(
+        update.message,
+        "🤖 使用帮助\n\n"
+        "🔍 搜索方法:\n"
+        "1. 直接发送关键词\n"
+        "2. 使用 /search 关键词 命令\n"
+        "3. 点击『⚡ 快速搜索』选择特定网盘\n"
+        f"4. 在任意聊天中输入 @{context.bot.username} 关键词\n\n"
+        "📝 示例:\n"
+        "钢铁侠\n"
+        "天下第一\n\n"
+        "📋 功能特点:\n"
+        "• 按资源类型分类显示\n"
+        "• 支持分页浏览\n"
+        "• 显示完整资源链接\n"
+        "• 快速搜索特定网盘\n"
+        "• 一键复制磁力和迅雷链接\n\n"
+        "⚡ 搜索后会显示资源类型按钮，点击查看详情",
+        reply_markup=reply_markup
+    )
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """统计命令"""
+    # 权限检查
+    user_id = update.effective_user.id
+    if not check_user_permission(user_id):
+        logger.warning(f"❌ 用户 {user_id} 无权限访问")
+        await send_reply(update.message, "❌ 您无权使用此机器人")
+        return
+    
+    menu_buttons = [
+        ["🔍 开始搜索", "📋 使用帮助"],
+        ["⚡ 快速搜索", "📊 机器人状态"]
+    ]
+    reply_markup = ReplyKeyboardMarkup(menu_buttons, resize_keyboard=True)
+    
+    
+    cache_stats = search_cache.stats()
+    page_stats = page_cache.stats()
+    session_stats = session_store.stats()
+    limit_stats = rate_limiter.stats()
+    backend_stats = backend_admission.stats()
+    outbound_stats = outbound.stats()
+    
+    await send_reply(
+        update.message,
+        f"📊 机器人状态\n\n"
+        f"✅ 运行正常\n"
+        f"🔗 API: 已连接\n"
+        f"🏗️ 架构: {ARCH}（性能档位 {PERF_PROFILE}）\n"
+        f"🐳 容器: 已部署\n"
+        f"👥 会话: {session_stats['sessions']} 个 / {session_stats['bytes'] / 1024 / 1024:.1f} MB, 淘汰 {session_stats['evictions']} 个\n"
+        f"💾 持久化: {'SQLite' if session_db else '未启用'}\n"
+        f"🗄️ 缓存: {cache_stats['entries']} 条 / {cache_stats['bytes'] / 1024 / 1024:.1f} MB, 命中率 {cache_stats['hit_rate']:.0%}\n"
+        f"📄 页面缓存: {page_stats['entries']} 页, 命中率 {page_stats['hit_rate']:.0%}\n"
+        f"🔗 合并请求: {search_stats['coalesced']} 次\n"
+        f"🧹 去重资源: {search_stats['duplicates']} 条\n"
+        f"🔥 缓存预热: {warm_stats['warmed']} 次, 跟踪关键词 {len(keyword_tracker.scores)} 个\n"
+        f"🚦 限流: 拦截 {limit_stats['limited']} 次 / 放行 {limit_stats['allowed']} 次\n"
+        f"🚥 后端: 进行中 {backend_stats['active']} / 排队 {backend_stats['waiting']}, 平均等待 {backend_stats['avg_wait'] * 1000:.0f} ms, 拒绝 {backend_stats['shed'] + backend_stats['timeouts']} 次\n"
+        f"📮 发送队列: 排队 {outbound_stats['queued']} 条, 合并编辑 {outbound_stats['coalesced']} 次, 429 重试 {outbound_stats['retries']} 次\n"
+        f"🕒 重启策略: unless-stopped\n\n"
+        f"⚡ 支持快速搜索以下网盘:\n"
+        f"• 115网盘\n• 阿里云盘\n• 百度云盘\n• 迅雷云盘\n"
+        f"• 夸克网盘\n• Pikpak\n• 天翼云盘\n• 磁力链接",
+        reply_markup=reply_markup
+    )
+
+async def shutdown(application):
+    """机器人停止时释放连接池和数据库"""
+    for handle in inline_pending.values():
+        handle.cancel()
+    # 先结束后台任务再关闭连接池，否则仍在运行的任务会重新创建一个不会被关闭的客户端
+    for task in list(cancellable_tasks):
+        task.cancel()
+    if background_tasks:
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+    await close_http_client()
+    db_executor.shutdown()
+    if session_db is not None:
+        session_db.close()
+
+# === 运行模式配置 ===
+# polling: 长轮询（默认）；webhook: 内置 HTTP 服务接收 Telegram 推送，可在负载均衡后运行多个实例
+BOT_MODE = os.getenv('BOT_MODE', 'polling').strip().lower()
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').rstrip('/')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram').strip('/')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+# Telegram 会在请求头 X-Telegram-Bot-Api-Secret-Token 中带上此值，不匹配的请求直接拒绝
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+# 自建 Bot API 服务地址，例如 http://127.0.0.1:8081，留空使用官方 api.telegram.org
+TELEGRAM_BASE_URL = os.getenv('TELEGRAM_BASE_URL', '').rstrip('/')
+# 同时处理的 Telegram 更新数，1 表示逐条处理（一个慢搜索会阻塞所有用户）
+CONCURRENT_UPDATES = int(perf_setting('CONCURRENT_UPDATES'))
+
+if BOT_MODE not in ('polling', 'webhook'):
+    raise Exception(f"BOT_MODE 只能是 polling 或 webhook，当前为: {BOT_MODE}")
+if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+    raise Exception("webhook 模式需要设置 WEBHOOK_URL 环境变量")
+
+def build_application():
+    """创建 Application 并注册所有处理器（基准测试也通过它驱动真实的处理流程）"""
+    builder = Application.builder().token(BOT_TOKEN).concurrent_updates(CONCURRENT_UPDATES).post_shutdown(shutdown)
+    if TELEGRAM_BASE_URL:
+        builder = builder.base_url(f"{TELEGRAM_BASE_URL}/bot").base_file_url(f"{TELEGRAM_BASE_URL}/file/bot")
+    application = builder.build()
+    
+    application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(CallbackQueryHandler(button_handler))
+    application.add_handler(InlineQueryHandler(inline_query_handler))
+    
+    if CACHE_WARM_INTERVAL > 0 and SEARCH_CACHE_TTL > 0:
+        if application.job_queue is None:
+            logger.warning("⚠️ 未安装 python-telegram-bot[job-queue]，缓存预热已关闭")
+        else:
+            application.job_queue.run_repeating(warm_cache_job, interval=CACHE_WARM_INTERVAL, first=CACHE_WARM_INTERVAL, name='cache_warm')
+    return application
+
+def main():
+    """启动机器人"""
+    try:
+        logger.info("🚀 启动机器人...")
+        application = build_application()
+        
+        if METRICS_PORT:
+            start_http_server(METRICS_PORT, addr=METRICS_ADDR, registry=metrics_registry)
+            logger.info(f"📈 监控指标: http://{METRICS_ADDR}:{METRICS_PORT}/metrics")
+        
+        logger.info("✅ 机器人启动完成")
+        if BOT_MODE == 'webhook':
+            logger.info(f"🌐 Webhook 模式: 监听 {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}，最大连接数 {WEBHOOK_MAX_CONNECTIONS}")
+            if not WEBHOOK_SECRET:
+                logger.warning("⚠️ 未设置 WEBHOOK_SECRET，将接受任何来源的推送")
+            application.run_webhook(
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                url_path=WEBHOOK_PATH,
+                webhook_url=f"{WEBHOOK_URL}/{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET or None,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+            )
+        else:
+            application.run_polling()
+        
+    except Exception as e:
+        logger.error(f"❌ 启动失败: {e}")
+
+if __name__ == "__main__":
+    main()